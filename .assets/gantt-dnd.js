@@ -2,6 +2,8 @@
 // Fixes:
 //  - dispatch the event on the EventListener host (NOT document)
 //  - use xaxis.p2l(px) -> xaxis.l2d(lin) for pixel->date conversion
+//  - webgl renderer: bars are canvas pixels, so the dragged bar is the one plotly last hovered
+//  - customdata is either [TaskId, Worker] or just the TaskId, with the worker read from the bar's y
 
 (function() {
   function findGraphDiv() {
@@ -40,14 +42,19 @@
     }
   }
 
-  function resolveTaskIdFromNode(gd, rectNode) {
+  // -> [TaskId, Worker]
+  function taskRef(cd, y) {
+    return Array.isArray(cd) ? cd : [cd, y];
+  }
+
+  function resolveCustomDataFromNode(gd, rectNode) {
     const curve = rectNode.getAttribute('data-curvenumber');
     const point = rectNode.getAttribute('data-pointnumber');
     if (curve == null || point == null) return null;
     const c = gd.data[+curve];
     if (!c || !c.customdata) return null;
-    const cd = c.customdata[+point]; // [TaskId, Worker]
-    return cd ? cd[0] : null;
+    const cd = c.customdata[+point];
+    return cd ? taskRef(cd, c.y && c.y[+point]) : null;
   }
 
   function install() {
@@ -57,19 +64,33 @@
     gd._ganttDndInstalled = true;
 
     let dragging = null;
+    let hovered = null; // customdata of the point under the cursor (webgl traces have no DOM nodes)
+
+    if (gd.on) {
+      gd.on('plotly_hover', function(ev) {
+        const p = ev && ev.points && ev.points[0];
+        hovered = p && p.customdata ? taskRef(p.customdata, p.y) : null;
+      });
+      gd.on('plotly_unhover', function() { hovered = null; });
+    }
 
     gd.addEventListener('mousedown', function(e) {
       const t = e.target;
-      if (!(t && t.tagName === 'rect' && t.hasAttribute('data-pointnumber'))) return;
-
-      const taskId = resolveTaskIdFromNode(gd, t);
-      if (!taskId) return;
+      let cd = null;
+      if (t && t.tagName === 'rect' && t.hasAttribute('data-pointnumber')) {
+        cd = resolveCustomDataFromNode(gd, t);
+      } else if (hovered && (gd._fullData || []).some(function(tr) { return tr.type === 'scattergl'; })) {
+        cd = hovered;
+        e.stopPropagation(); // keep plotly from starting a pan/zoom drag
+      }
+      if (!cd || !cd[0]) return;
+      const taskId = cd[0], fromWorker = cd[1];
 
       const plotArea = gd.querySelector('.cartesianlayer .plot');
       if (!plotArea) return;
 
       const plotBox = plotArea.getBoundingClientRect();
-      dragging = { taskId, plotBox };
+      dragging = { taskId, fromWorker, plotBox };
       e.preventDefault();
     }, true);
 
@@ -78,18 +99,19 @@
       const plotArea = gd.querySelector('.cartesianlayer .plot');
       if (!plotArea) { dragging = null; return; }
 
-      const { plotBox, taskId } = dragging;
+      const { plotBox, taskId, fromWorker } = dragging;
       const px = e.clientX - plotBox.left; // x inside plot
       const py = e.clientY - plotBox.top;  // y inside plot
 
       const xISO = pxToXISO(gd, px);
       const worker = pyToWorker(gd, py);
 
-      if (xISO && worker) {
-        host.dispatchEvent(new CustomEvent('gantt-dnd-drop', {
-          detail: { taskId, dropWorkerName: worker, dropXISO: xISO },
-          bubbles: true
-        }));
+      if (xISO && worker && window.ganttOps) {
+        // the server gets the move through the op queue (gantt-ops.js); the gantt-dnd-drop event is for
+        // the optimistic redraw, tagged with the op number its verdict will carry
+        const detail = { taskId, fromWorkerName: fromWorker, dropWorkerName: worker, dropXISO: xISO };
+        detail.op = window.ganttOps.push(Object.assign({ kind: 'drop' }, detail));
+        host.dispatchEvent(new CustomEvent('gantt-dnd-drop', { detail: detail, bubbles: true }));
       }
       dragging = null;
     });
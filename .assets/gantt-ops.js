@@ -0,0 +1,64 @@
+// Client-side operation queue for the planner.
+// Gantt drops and "Push to plan" clicks are queued here instead of each firing its own server callback.
+// Whatever arrives within WINDOW_MS goes to the server as one batch, {seq, ops}, dispatched as a
+// `gantt-ops` event on the EventListener with id="gantt_ops_listener" (see app.py). Only one batch is in
+// flight at a time: the next one waits for the server's ack (ops_ack -> dash_clientside.ops.settle), so
+// ops reach the server in the order they were made. A batch without an answer after RESEND_MS is sent
+// again under the same seq; the server ignores a seq it has already applied.
+
+(function() {
+  const WINDOW_MS = 120;
+  const RESEND_MS = 10000;
+
+  let queue = [];       // ops not yet sent
+  let inflight = null;  // {seq, ops} awaiting its ack
+  let seq = 0, opSeq = 0;
+  let flushTimer = null, resendTimer = null;
+
+  function send() {
+    const host = document.getElementById('gantt_ops_listener');
+    clearTimeout(resendTimer);
+    resendTimer = setTimeout(send, RESEND_MS);
+    if (host) host.dispatchEvent(new CustomEvent('gantt-ops', { detail: inflight, bubbles: true }));
+  }
+
+  function flush() {
+    flushTimer = null;
+    if (inflight || !queue.length) return;
+    inflight = { seq: ++seq, ops: queue };
+    queue = [];
+    send();
+  }
+
+  window.ganttOps = {
+    // queue one op ({kind: "drop" | "add", ...}); returns its op number
+    push: function(op) {
+      op.op = ++opSeq;
+      queue.push(op);
+      if (!flushTimer) flushTimer = setTimeout(flush, WINDOW_MS);
+      return op.op;
+    },
+    settle: function(ack) {
+      if (!inflight || !ack || ack.seq !== inflight.seq) return;
+      inflight = null;
+      clearTimeout(resendTimer);
+      if (queue.length && !flushTimer) flushTimer = setTimeout(flush, 0);
+    }
+  };
+
+  window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ops: {
+      queueBooking: function(nClicks, customer, serviceId, workerId) {
+        if (!customer || !serviceId || !workerId) return window.dash_clientside.no_update;
+        return window.ganttOps.push({ kind: 'add', customer: customer, service_id: serviceId, worker_id: workerId });
+      },
+      ready: function() {
+        return true;  // tells add_booking that clicks are queued here
+      },
+      settle: function(ack) {
+        window.ganttOps.settle(ack);
+        return ack ? ack.seq : window.dash_clientside.no_update;
+      }
+    }
+  });
+})();
@@ -0,0 +1,134 @@
+// Optimistic Gantt drag & drop (GANTT_DND=optimistic).
+// applyDrop redraws the dragged bar's source and destination rows in the browser right away, with the
+// same rule as the server: rows start at the first slot and run back to back; the bar goes in front of the
+// first bar starting after the drop time. Nothing is kept for undo: the server redraws every row its batch
+// touched (a refused drop touches the two rows the bar was moved between), so its plan always has the
+// last word, also over a bar a redraw of other edits has wiped in the meantime.
+// Figures may hold typed arrays ({dtype, bdata}) from gantt.py's compact mode; both forms are read.
+
+(function() {
+  const TYPED = {
+    f8: Float64Array, f4: Float32Array, i4: Int32Array, u4: Uint32Array,
+    i2: Int16Array, u2: Uint16Array, i1: Int8Array, u1: Uint8Array
+  };
+
+  function decode(a) {
+    if (!a || a.bdata === undefined) return a || [];
+    const bin = atob(a.bdata);
+    const bytes = new Uint8Array(bin.length);
+    for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+    return new TYPED[a.dtype](bytes.buffer);
+  }
+
+  // date-axis value -> epoch ms; naive ISO strings are read as UTC, like the axis does
+  function toMs(v) {
+    if (typeof v === 'number') return v;
+    const s = String(v).replace(' ', 'T');
+    return Date.parse(/Z|[+-]\d\d:?\d\d$/.test(s) ? s : s + 'Z');
+  }
+
+  function taskId(cd) {
+    return Array.isArray(cd) ? cd[0] : cd;
+  }
+
+  // every bar in the figure as {trace, k, id, worker, start, dur}; webgl bars are 4-vertex segments
+  function collectBars(fig) {
+    const bars = [];
+    fig.data.forEach(function(tr, t) {
+      if (tr.name === 'labels' || !tr.customdata) return;
+      const cd = tr.customdata, y = tr.y || [];
+      if (tr.type === 'scattergl') {
+        const x = decode(tr.x);
+        for (let k = 0; 4 * k < x.length; k++) {
+          const start = toMs(x[4 * k]);
+          bars.push({trace: t, k: k, id: taskId(cd[4 * k]), worker: y[4 * k], start: start,
+                     dur: toMs(x[4 * k + 2]) - start});
+        }
+      } else {
+        const base = decode(tr.base), x = decode(tr.x);
+        for (let k = 0; k < x.length; k++) {
+          bars.push({trace: t, k: k, id: taskId(cd[k]), worker: y[k], start: toMs(base[k]), dur: +x[k]});
+        }
+      }
+    });
+    return bars;
+  }
+
+  // copy of fig with the bars' new start/worker written into fresh arrays of the traces they belong to
+  function writeBars(fig, moved) {
+    const data = fig.data.slice();
+    const byTrace = {};
+    moved.forEach(function(b) { (byTrace[b.trace] = byTrace[b.trace] || []).push(b); });
+    Object.keys(byTrace).forEach(function(t) {
+      const tr = fig.data[t], out = Object.assign({}, tr), y = (tr.y || []).slice();
+      const cd = (tr.customdata || []).slice();
+      const relabel = function(i, worker) {
+        y[i] = worker;
+        if (Array.isArray(cd[i])) cd[i] = [cd[i][0], worker].concat(cd[i].slice(2));
+      };
+      if (tr.type === 'scattergl') {
+        const x = Float64Array.from(decode(tr.x), toMs);
+        byTrace[t].forEach(function(b) {
+          x[4 * b.k] = b.start; x[4 * b.k + 1] = b.start + b.dur / 2; x[4 * b.k + 2] = b.start + b.dur;
+          for (let j = 0; j < 3; j++) relabel(4 * b.k + j, b.worker);
+        });
+        out.x = x;
+      } else {
+        const base = Float64Array.from(decode(tr.base), toMs);
+        byTrace[t].forEach(function(b) { base[b.k] = b.start; relabel(b.k, b.worker); });
+        out.base = base;
+      }
+      out.y = y; out.customdata = cd;
+      data[t] = out;
+    });
+    // the webgl label trace follows its bars by TaskId
+    const li = fig.data.findIndex(function(tr) { return tr.name === 'labels'; });
+    if (li >= 0 && (fig.data[li].customdata || []).length) {
+      const tr = fig.data[li], byId = {};
+      moved.forEach(function(b) { byId[b.id] = b; });
+      const x = Float64Array.from(decode(tr.x), toMs), y = (tr.y || []).slice();
+      tr.customdata.forEach(function(cd, j) {
+        const b = byId[taskId(cd)];
+        if (b) { x[j] = b.start; y[j] = b.worker; }
+      });
+      data[li] = Object.assign({}, tr, {x: x, y: y});
+    }
+    return Object.assign({}, fig, {data: data});
+  }
+
+  // the figure after one drop, or null when the dragged bar is not on it
+  function moveBar(fig, detail, baseMs) {
+    const bars = collectBars(fig);
+    const bar = bars.find(function(b) { return b.id === detail.taskId; });
+    const dropMs = Date.parse(detail.dropXISO);
+    if (!bar || !detail.dropWorkerName || isNaN(dropMs)) return null;
+    const rowOf = function(worker) {
+      return bars.filter(function(b) { return b.worker === worker && b !== bar; })
+                 .sort(function(a, b) { return a.start - b.start; });
+    };
+    const src = rowOf(bar.worker);
+    const dest = detail.dropWorkerName === bar.worker ? src : rowOf(detail.dropWorkerName);
+    // insertion index = bars of the (shortened) destination row starting at or before the drop
+    let t = baseMs, pos = 0;
+    while (pos < dest.length && t <= dropMs) t += dest[pos++].dur;
+    bar.worker = detail.dropWorkerName;
+    dest.splice(pos, 0, bar);
+    const moved = [];
+    [src, dest].forEach(function(row) {
+      let start = baseMs;
+      row.forEach(function(b) { b.start = start; start += b.dur; moved.push(b); });
+    });
+    return writeBars(fig, moved);
+  }
+
+  window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    gantt: {
+      applyDrop: function(event, figure, baseMs) {
+        const no = window.dash_clientside.no_update;
+        const detail = event && event.type === 'gantt-dnd-drop' ? event.detail : null;
+        if (!detail || !figure || !figure.data) return no;
+        return moveBar(figure, detail, baseMs) || no;
+      }
+    }
+  });
+})();
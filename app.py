@@ -1,15 +1,25 @@
 import dash
-from dash import Dash, html, dcc, Input, Output, State
+from dash import Dash, html, dcc, Input, Output, State, ClientsideFunction
 from dash.exceptions import PreventUpdate
 from dash_extensions import EventListener
-import plotly.express as px
+from flask import Response
 import pandas as pd
-import json
+import os
+from datetime import date, datetime, timedelta
 
-from spa_data import WORKERS, SERVICES, DAY_START, SLOT_MIN
-from utils import build_schedule_df
+from spa_data import WORKERS, SERVICES, DAY_START, DAY_END, SLOT_MIN
+from utils import build_schedule_df, day_base, epoch_minutes, RowParts, StartIndex
+from gantt import RENDERERS, TASK_HOVER, timeline_figure, patch_figure, patch_labels
+from plan_state import append_task, column, insert_task, locate_task, remove_task
+from plan_codec import pack_state, unpack_state
+from session_store import open_store
+from plan_db import PlanDB
+from assign import AUTO, assign
+import metrics
+from metrics import instrument
 
-app = Dash(__name__, suppress_callback_exceptions=True)
+# the browser scripts (drag & drop, the op queue) live in .assets/
+app = Dash(__name__, assets_folder=".assets", suppress_callback_exceptions=True)
 server = app.server
 
 # quick lookups
@@ -17,21 +27,116 @@ services_idx = {s["id"]: s for s in SERVICES}
 workers_idx  = {w["id"]: w for w in WORKERS}
 worker_name_to_id = {w["name"]: w["id"] for w in WORKERS}
 
+# The plan lives in the browser's `state` store by default, packed (plan_codec.pack_state). With
+# SESSION_STORE=memory or SESSION_STORE=sqlite:///sessions.db it stays on the server and the store holds
+# {"sid", "version", "touched"}.
+store = open_store(os.environ.get("SESSION_STORE"))
+# GANTT_RENDERER=webgl draws bars as batched WebGL line segments (for days with thousands of bookings)
+renderer = os.environ.get("GANTT_RENDERER", "svg").lower()
+if renderer not in RENDERERS:
+    raise ValueError(f"Unsupported GANTT_RENDERER {renderer!r}; use one of {RENDERERS}.")
+# GANTT_DND=optimistic moves a dropped bar in the browser at once (clientside callback in
+# .assets/gantt-optimistic.js); the server validates and stores the move, and its redraw of the touched rows
+# puts a refused move back. The default, "server", redraws after the server round trip.
+dnd_mode = os.environ.get("GANTT_DND", "server").lower()
+if dnd_mode not in ("server", "optimistic"):
+    raise ValueError(f"Unsupported GANTT_DND {dnd_mode!r}; use 'server' or 'optimistic'.")
+# figures go out as plain dicts with typed (base64) numeric arrays; customdata is just the TaskId
+COMPACT = dict(customdata_cols=("TaskId",), compact=True)
+# METRICS=1 times every callback and serves the numbers at /metrics (Prometheus text format)
+if metrics.ENABLED:
+    @server.route("/metrics")
+    def metrics_route():
+        return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+# laid-out worker rows, shared by all sessions; an edit re-lays only the rows it rewrote
+frame_parts = RowParts()
+# task start offsets per worker column (by rev), for placing dropped bars; drops update it row by row
+start_index = StartIndex(services_idx)
+# PLAN_DB=/path/plan.db persists today's bookings in SQLite across restarts and reloads. Every session
+# holds a copy of the day and a write replaces the rows it touched, so concurrent tabs: last writer wins.
+plan_db = PlanDB(os.environ["PLAN_DB"]) if os.environ.get("PLAN_DB") else None
+if plan_db and os.path.realpath(getattr(store, "path", "")) == os.path.realpath(plan_db.path):
+    raise ValueError("SESSION_STORE and PLAN_DB must be different SQLite files.")
+
 def initial_state():
-    # start empty; bookings are pushed straight to plan
+    # start empty (or from PLAN_DB); bookings are pushed straight to plan
+    today = date.today().isoformat()
+    stored = plan_db.load_days(today, today).get(today, {}) if plan_db else {}
     return {
         "seq": 0,
-        "workers": [{"worker_id": w["id"], "tasks": []} for w in WORKERS]
+        "day": today,  # the day these rows belong to, even if the page stays open past midnight
+        "workers": [column(w["id"], stored.get(w["id"], [])) for w in WORKERS]
     }
 
+def persist(state):
+    """Write the rows an edit touched to PLAN_DB in one transaction."""
+    if not plan_db:
+        return
+    day = state.get("day") or date.today().isoformat()  # states created before "day" was stored
+    for col in state["workers"]:
+        if col["worker_id"] in state["touched"]:
+            plan_db.stage(day, col["worker_id"], col["tasks"])
+    plan_db.flush()
+
+def initial_store_data():
+    if store is None:
+        return pack_state(initial_state())
+    return {"sid": store.create(initial_state()), "version": 0}
+
+def load_state(data):
+    """The plan behind the `state` store value."""
+    if store is None:
+        return unpack_state(data)
+    try:
+        return store.load(data["sid"])[1]
+    except KeyError:  # session expired or the memory store restarted; the page must be reloaded
+        raise PreventUpdate
+
+def commit_edit(data, edit):
+    """Apply edit(state) -> new state and return the next `state` store value."""
+    if store is None:
+        new_state = edit(unpack_state(data))
+        persist(new_state)
+        return pack_state(new_state)
+    try:
+        version, new_state = store.update(data["sid"], edit)
+    except KeyError:
+        raise PreventUpdate
+    persist(new_state)
+    return {"sid": data["sid"], "version": version, "touched": new_state["touched"]}
+
+def current_store_data(data):
+    """A `state` store value that redraws every row of the plan as it is now (answers a resent batch)."""
+    everyone = [w["id"] for w in WORKERS]
+    if store is None:
+        return pack_state({**unpack_state(data), "touched": everyone})
+    try:
+        version, _ = store.load(data["sid"])
+    except KeyError:
+        raise PreventUpdate
+    return {"sid": data["sid"], "version": version, "touched": everyone}
+
+def optimistic_stores():
+    # dnd_base: the rows' first slot in epoch ms (the figure's time base)
+    base_ms = epoch_minutes(day_base(DAY_START, SLOT_MIN)) * 60_000
+    return [dcc.Store(id="dnd_base", data=base_ms)]
+
 def make_layout():
-    # IMPORTANT: id="gantt_dnd_listener" must match assets/gantt-dnd.js
-    return EventListener(
+    # IMPORTANT: id="gantt_ops_listener" must match .assets/gantt-ops.js and id="gantt_dnd_listener"
+    # .assets/gantt-dnd.js; drags and "Push to plan" clicks reach the server as gantt-ops batches (without
+    # the scripts, add_booking applies each click on its own)
+    planner = EventListener(
         id="gantt_dnd_listener",
-        events=[{"event": "gantt-dnd-drop"}],
+        events=[{"event": "gantt-dnd-drop", "props": ["type", "detail"]}],
         children=html.Div(
             [
-                dcc.Store(id="state", data=initial_state()),
+                dcc.Store(id="state", data=initial_store_data()),
+                # ops_ack: the server's answer to one batch, {"seq", "verdicts": [{"op", "ok"}, ...]}
+                dcc.Store(id="ops_ack"),
+                dcc.Store(id="ops_queued"),
+                dcc.Store(id="ops_settled"),
+                dcc.Store(id="ops_client"),  # true once .assets/gantt-ops.js runs in the page
+                *(optimistic_stores() if dnd_mode == "optimistic" else []),
                 html.Div(
                     [
                         # LEFT 20% — Add booking
@@ -50,7 +155,8 @@ def make_layout():
                                         ),
                                         dcc.Dropdown(
                                             id="in_worker",
-                                            options=[{"label": w["name"], "value": w["id"]} for w in WORKERS],
+                                            options=[{"label": w["name"], "value": w["id"]} for w in WORKERS]
+                                                    + [{"label": "Auto (balance load)", "value": AUTO}],
                                             placeholder="Worker", clearable=False
                                         ),
                                         html.Button("Push to plan", id="btn_push", n_clicks=0, className="btn primary"),
@@ -74,81 +180,107 @@ def make_layout():
             ]
         ),
     )
+    return EventListener(id="gantt_ops_listener", events=[{"event": "gantt-ops", "props": ["type", "detail"]}],
+                         children=planner)
 
 app.layout = make_layout
 
 # ---------------- ADD BOOKING ----------------
+def pick_worker(state, service_id):
+    """Worker whose row ends earliest and can still fit the service before DAY_END, or None."""
+    base = day_base(DAY_START, SLOT_MIN)
+    span_min = (datetime.combine(base.date(), DAY_END) - base) // timedelta(minutes=1)
+    tails = {c["worker_id"]: sum(services_idx[t["service_id"]]["duration_min"] for t in c["tasks"])
+             for c in state["workers"]}
+    rows, _ = assign([(services_idx[service_id]["duration_min"], 0)], tails, span_min)
+    return next((wid for wid, row in rows.items() if row), None)
+
+def booking_edit(op):
+    """op = {"customer", "service_id", "worker_id"} (worker_id may be AUTO) -> edit(state)."""
+    customer, service_id, worker_id = op.get("customer"), op.get("service_id"), op.get("worker_id")
+    if not customer or service_id not in services_idx or not (worker_id in workers_idx or worker_id == AUTO):
+        raise PreventUpdate
+
+    # allocated here, before the session store opens its transaction: next_seq() starts one of its own
+    task_seq = plan_db.next_seq() if plan_db else None
+
+    def edit(state):
+        target = pick_worker(state, service_id) if worker_id == AUTO else worker_id
+        if target is None:
+            raise PreventUpdate  # nobody can fit it before closing
+        seq = task_seq or state["seq"] + 1
+        task = {"id": f"t{seq}", "customer": customer, "service_id": service_id}
+        return {**state, "seq": seq, "workers": append_task(state["workers"], target, task), "touched": [target]}
+    return edit
+
 @app.callback(
-    Output("state", "data"),
+    Output("state", "data", allow_duplicate=True),
     Input("btn_push", "n_clicks"),
     State("in_customer", "value"),
     State("in_service", "value"),
     State("in_worker", "value"),
+    State("ops_client", "data"),
     State("state", "data"),
     prevent_initial_call=True,
 )
-def add_booking(n_clicks, customer, service_id, worker_id, state):
-    if not customer or not service_id or not worker_id:
+@instrument("add_booking", payload="state")
+def add_booking(n_clicks, customer, service_id, worker_id, queued, state):
+    """"Push to plan" without the client scripts; with them the click is queued (ops.queueBooking)."""
+    if queued:
         raise PreventUpdate
-    state = json.loads(json.dumps(state))  # deep copy
-    state["seq"] += 1
-    task = {"id": f"t{state['seq']}", "customer": customer, "service_id": service_id}
-    for col in state["workers"]:
-        if col["worker_id"] == worker_id:
-            col["tasks"].append(task)
-            break
-    return state
+    return commit_edit(state, booking_edit({"customer": customer, "service_id": service_id, "worker_id": worker_id}))
 
 # ---------------- GANTT ----------------
 @app.callback(Output("gantt", "figure"), Input("state", "data"))
-def update_gantt(state):
-    df = build_schedule_df(state, services_idx, workers_idx, DAY_START)
-    if df.empty:
-        fig = px.timeline()
-        fig.update_layout(title="No bookings yet.", height=760, margin=dict(l=20, r=20, t=40, b=20))
-        return fig
-
-    # Build timeline
-    fig = px.timeline(
-        df, x_start="Start", x_end="Finish",
-        y="Worker", color="Service", text="Customer", hover_data=["Duration(min)"]
-    )
+@instrument("update_gantt", payload="figure")
+def update_gantt(data):
+    # always redrawn from the server's plan, optimistic drags included: a patch of other rows may have
+    # overwritten a bar drawn in the browser, and the server's rows are the ones that count
+    df = build_schedule_df(load_state(data), services_idx, workers_idx, DAY_START, parts=frame_parts)
+    metrics.set_gauge("dash", "tasks", len(df))
+    # edits list the worker rows they changed; anything else (first load) gets a full figure
+    touched = data.get("touched")
+    if touched is None:
+        return timeline_figure(df, SERVICES, [w["name"] for w in WORKERS], renderer=renderer,
+                               hovertemplate=TASK_HOVER, **COMPACT)
+    return patch_figure(df, SERVICES, [workers_idx[wid]["name"] for wid in touched], renderer=renderer, **COMPACT)
 
-    # Ensure bars carry the identifiers the JS needs: [TaskId, Worker]
-    # (Some Plotly versions ignore px.timeline's custom_data arg; force it here.)
-    if "TaskId" in df.columns and "Worker" in df.columns:
-        fig.update_traces(customdata=df[["TaskId", "Worker"]].to_numpy().tolist())
-
-    fig.update_yaxes(autorange="reversed")
-    fig.update_traces(
-        textposition="inside",
-        insidetextanchor="start",
-        textfont_size=12,
-        cliponaxis=False,
-        hovertemplate="%{text}<br>%{customdata[1]} • %{customdata[0]}"
-    )
-    fig.update_layout(margin=dict(l=20, r=20, t=40, b=20), height=760)
-    return fig
-
-# ---------------- HANDLE GANTT DRAG/DROP ----------------
 @app.callback(
-    Output("state", "data"),
-    Input("gantt_dnd_listener", "event"),
+    Output("gantt", "figure", allow_duplicate=True),
+    Input("gantt", "relayoutData"),
     State("state", "data"),
-    prevent_initial_call=True
+    prevent_initial_call=True,
 )
-def on_gantt_drop(event, state):
+@instrument("update_gantt_labels", payload="figure")
+def update_gantt_labels(relayout, data):
+    """webgl renderer: label only the bars inside the zoomed x window."""
+    if renderer != "webgl" or not relayout:
+        raise PreventUpdate
+    if relayout.get("xaxis.autorange"):
+        x_range = None
+    elif "xaxis.range[0]" in relayout:
+        x_range = (relayout["xaxis.range[0]"], relayout["xaxis.range[1]"])
+    elif "xaxis.range" in relayout:
+        x_range = tuple(relayout["xaxis.range"])
+    else:
+        raise PreventUpdate
+    df = build_schedule_df(load_state(data), services_idx, workers_idx, DAY_START, parts=frame_parts)
+    return patch_labels(df, SERVICES, x_range, **COMPACT)
+
+# ---------------- HANDLE GANTT DRAG/DROP ----------------
+def column_of(workers, worker_id):
+    return next(c for c in workers if c["worker_id"] == worker_id)
+
+def drop_edit(detail):
     """
-    event.detail = {
+    detail = {
       "taskId": "...",
+      "fromWorkerName": "Budi",
       "dropWorkerName": "Ayu",
       "dropXISO": "2025-08-11T10:30:00.000Z"
     }
     We reassign to the chosen worker (based on y drop) and compute the new index from dropX.
     """
-    if not event or event.get("type") != "gantt-dnd-drop":
-        raise PreventUpdate
-    detail = event.get("detail") or {}
     task_id = detail.get("taskId")
     w_name  = detail.get("dropWorkerName")
     x_iso   = detail.get("dropXISO")
@@ -159,40 +291,134 @@ def on_gantt_drop(event, state):
         drop_ts = pd.to_datetime(x_iso)
     except Exception:
         raise PreventUpdate
+    if drop_ts.tzinfo is not None:
+        drop_ts = drop_ts.tz_convert(None)  # plotly date axes are naive; the JS reports them as UTC
 
     dest_worker_id = worker_name_to_id.get(w_name)
     if not dest_worker_id:
         raise PreventUpdate
 
-    # deep copy
-    state = json.loads(json.dumps(state))
+    src_hint = worker_name_to_id.get(detail.get("fromWorkerName"))
+    drop_min = (drop_ts - day_base(DAY_START, SLOT_MIN)) / pd.Timedelta(minutes=1)
 
-    # 1) remove the dragged task from its current worker
-    task = None
-    for col in state["workers"]:
-        for i, t in enumerate(list(col["tasks"])):
-            if t["id"] == task_id:
-                task = col["tasks"].pop(i)
-                break
-        if task:
-            break
-    if task is None:
+    def edit(state):
+        workers = state["workers"]
+
+        # 1) remove the dragged task from its current worker (the bar's own row is searched first)
+        src_worker_id, pos = locate_task(workers, task_id, src_hint)
+        if src_worker_id is None:
+            raise PreventUpdate
+        src_col = column_of(workers, src_worker_id)
+        workers, task = remove_task(workers, src_worker_id, pos)
+        start_index.remove(src_col, pos, column_of(workers, src_worker_id))
+
+        # 2) insert index = tasks in the destination row starting at or before the drop time
+        dest_col = column_of(workers, dest_worker_id)
+        insert_idx = start_index.position(dest_col, drop_min)
+
+        # 3) insert into destination worker at computed index
+        workers = insert_task(workers, dest_worker_id, insert_idx, task)
+        start_index.insert(dest_col, insert_idx, services_idx[task["service_id"]]["duration_min"],
+                           column_of(workers, dest_worker_id))
+        return {**state, "workers": workers, "touched": list(dict.fromkeys([src_worker_id, dest_worker_id]))}
+    return edit
+
+# ---------------- OPERATION BATCHES ----------------
+OP_EDITS = {"add": booking_edit, "drop": drop_edit}
+
+@app.callback(
+    Output("state", "data"),
+    Output("ops_ack", "data"),
+    Input("gantt_ops_listener", "event"),
+    State("state", "data"),
+    prevent_initial_call=True
+)
+@instrument("apply_ops", payload="state")
+def apply_ops(event, state):
+    """
+    event.detail = {"seq": 7, "ops": [{"op": 12, "kind": "drop", ...}, {"op": 13, "kind": "add", ...}]}
+    The browser sends one batch at a time (.assets/gantt-ops.js); its ops are applied in order as one
+    state transition and one redraw. An op that fails is skipped and reported; a batch whose seq was
+    already applied (a resend after a lost response) changes nothing but gets the saved verdicts back,
+    with a full redraw so the browser catches up. If the session is gone (expired, or the memory store
+    restarted) every op is refused and the page gets a new session and a full redraw.
+    """
+    detail = (event or {}).get("detail") or {}
+    seq, ops = detail.get("seq"), detail.get("ops") or []
+    if (event or {}).get("type") != "gantt-ops" or seq is None:
         raise PreventUpdate
+    verdicts, resent = [], []
+    # each op's edit is built before the store transaction (booking_edit allocates its task id there)
+    op_edits = []
+    for op in ops:
+        try:
+            op_edits.append(OP_EDITS[op.get("kind")](op))
+        except (PreventUpdate, KeyError):
+            op_edits.append(None)
 
-    # 2) compute insert index based on dropX relative to destination worker's current schedule
-    df = build_schedule_df(state, services_idx, workers_idx, DAY_START)
-    dest_worker_name = workers_idx[dest_worker_id]["name"]
-    w_rows = df[df["Worker"] == dest_worker_name].sort_values("Start")
+    def edit(state):
+        if seq <= state.get("op_seq", 0):
+            if seq == state["op_seq"]:
+                verdicts.extend(state.get("op_verdicts", []))
+            resent.append(seq)
+            raise PreventUpdate
+        touched = []
+        for op, op_edit in zip(ops, op_edits):
+            try:
+                if op_edit is None:
+                    raise PreventUpdate
+                state = op_edit(state)
+                touched += state["touched"]
+                verdicts.append({"op": op.get("op"), "ok": True})
+            except (PreventUpdate, KeyError):
+                verdicts.append({"op": op.get("op"), "ok": False})
+                if dnd_mode == "optimistic" and op.get("kind") == "drop":
+                    # the browser already moved the bar: redraw both rows to put it back
+                    names = (op.get("fromWorkerName"), op.get("dropWorkerName"))
+                    touched += [worker_name_to_id[n] for n in names if n in worker_name_to_id]
+        return {**state, "op_seq": seq, "op_verdicts": list(verdicts), "touched": list(dict.fromkeys(touched))}
 
-    # count tasks that start before the drop time -> insertion index
-    insert_idx = int((w_rows["Start"] <= drop_ts).sum())
+    try:
+        value = commit_edit(state, edit)
+    except PreventUpdate:
+        if resent:
+            return current_store_data(state), {"seq": seq, "verdicts": verdicts}
+        # edit() never ran: the store has no such session
+        return initial_store_data(), {"seq": seq, "verdicts": [{"op": op.get("op"), "ok": False} for op in ops]}
+    return value, {"seq": seq, "verdicts": verdicts}
 
-    # 3) insert into destination worker at computed index
-    dest_col = next(c for c in state["workers"] if c["worker_id"] == dest_worker_id)
-    insert_idx = max(0, min(insert_idx, len(dest_col["tasks"])))
-    dest_col["tasks"].insert(insert_idx, task)
+app.clientside_callback(
+    ClientsideFunction(namespace="ops", function_name="queueBooking"),
+    Output("ops_queued", "data"),
+    Input("btn_push", "n_clicks"),
+    State("in_customer", "value"),
+    State("in_service", "value"),
+    State("in_worker", "value"),
+    prevent_initial_call=True,
+)
+app.clientside_callback(
+    ClientsideFunction(namespace="ops", function_name="ready"),
+    Output("ops_client", "data"),
+    Input("state", "data"),
+)
+app.clientside_callback(
+    ClientsideFunction(namespace="ops", function_name="settle"),
+    Output("ops_settled", "data"),
+    Input("ops_ack", "data"),
+    prevent_initial_call=True,
+)
 
-    return state
+if dnd_mode == "optimistic":
+    # the browser moves the bar at once; the batch's redraw of the touched rows (update_gantt) then shows
+    # the server's outcome, which puts a refused move back
+    app.clientside_callback(
+        ClientsideFunction(namespace="gantt", function_name="applyDrop"),
+        Output("gantt", "figure", allow_duplicate=True),
+        Input("gantt_dnd_listener", "event"),
+        State("gantt", "figure"),
+        State("dnd_base", "data"),
+        prevent_initial_call=True,
+    )
 
 if __name__ == "__main__":
     app.run_server(host="0.0.0.0", port=8050, debug=True)
@@ -0,0 +1,68 @@
+# Automatic worker assignment.
+# Bookings are appended to a worker's row, so a worker is summarised by its tail: the offset
+# (minutes after opening) where its next booking would start. Jobs are placed longest-first on the
+# worker with the earliest tail (a heap of tails), then a local-improvement pass moves or swaps jobs
+# off the busiest worker while that lowers the makespan. Nothing may end after closing (span_min).
+
+import heapq
+
+AUTO = "auto"  # worker_id placeholder meaning "let the engine pick"
+
+def _finish(tail, jobs, row):
+    """When the row's last booking ends (its trailing gap does not count)."""
+    if not row:
+        return tail
+    return tail + sum(jobs[j][0] + jobs[j][1] for j in row) - jobs[row[-1]][1]
+
+def assign(jobs, tails, span_min, improve_rounds=500):
+    """Place jobs [(duration_min, gap_min), ...] on workers given their current tails {worker_id: offset}.
+
+    Returns ({worker_id: [job index, ...] in append order}, [job indices that fit nowhere]).
+    """
+    rows = {w: [] for w in tails}
+    load = dict(tails)  # where each worker's next booking would start
+    heap = [(t, i, w) for i, (w, t) in enumerate(tails.items())]  # i breaks ties in worker order
+    heapq.heapify(heap)
+    unplaced = []
+    for j in sorted(range(len(jobs)), key=lambda j: -jobs[j][0]):
+        dur, gap = jobs[j]
+        if not heap or heap[0][0] + dur > span_min:
+            unplaced.append(j)  # the least loaded worker can't fit it, so nobody can
+            continue
+        t, i, w = heapq.heappop(heap)
+        rows[w].append(j)
+        load[w] = t + dur + gap
+        heapq.heappush(heap, (load[w], i, w))
+
+    for _ in range(improve_rounds):
+        if not _improve(jobs, tails, span_min, rows, load):
+            break
+    return rows, sorted(unplaced)
+
+def _improve(jobs, tails, span_min, rows, load):
+    """Apply one move or swap that takes work off the busiest worker without creating a new maximum."""
+    w = max(load, key=load.get)
+    length = lambda j: jobs[j][0] + jobs[j][1]
+    for pos, j in enumerate(rows[w]):
+        for v in rows:
+            if v == w:
+                continue
+            # move j to the end of v
+            if load[v] + length(j) < load[w] and load[v] + jobs[j][0] <= span_min:
+                rows[w].pop(pos)
+                rows[v].append(j)
+                load[w] -= length(j)
+                load[v] += length(j)
+                return True
+            # swap j with a shorter job k of v, each taking the other's place
+            for qos, k in enumerate(rows[v]):
+                delta = length(j) - length(k)
+                if delta <= 0 or load[v] + delta >= load[w]:
+                    continue
+                rows[w][pos], rows[v][qos] = k, j
+                if _finish(tails[v], jobs, rows[v]) <= span_min and _finish(tails[w], jobs, rows[w]) <= span_min:
+                    load[w] -= delta
+                    load[v] += delta
+                    return True
+                rows[w][pos], rows[v][qos] = j, k
+    return False
@@ -0,0 +1,93 @@
+# Voice-note preprocessing before STT upload.
+# The recording is piped through one ffmpeg process that downmixes to 16 kHz mono, trims leading and
+# trailing silence, shortens long pauses and encodes FLAC; input is fed and output drained in chunks, so
+# no decoded full-rate copy is ever held in Python.
+
+import shutil
+import subprocess
+import threading
+import time
+
+SAMPLE_RATE = 16_000
+CHUNK = 64 * 1024
+FORMATS = {"flac": "audio/flac", "wav": "audio/wav", "ogg": "audio/ogg"}  # what both STT providers accept
+CODECS = {"flac": "flac", "wav": "pcm_s16le", "ogg": "libopus"}
+
+# silence below -45 dB: drop it at the start, and cut every pause longer than 0.6 s down to 0.3 s
+# (which also trims the tail)
+SILENCE_FILTER = (
+    "silenceremove=start_periods=1:start_duration=0.05:start_threshold=-45dB"
+    ":stop_periods=-1:stop_duration=0.6:stop_silence=0.3:stop_threshold=-45dB"
+)
+
+def ffmpeg_path():
+    return shutil.which("ffmpeg") or shutil.which("avconv")
+
+def _feed(stdin, audio):
+    """Write bytes (or a binary file object) to ffmpeg's stdin in CHUNK-sized pieces."""
+    try:
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            view = memoryview(audio)
+            for i in range(0, len(view), CHUNK):
+                stdin.write(view[i:i + CHUNK])
+        else:
+            while chunk := audio.read(CHUNK):
+                stdin.write(chunk)
+    except BrokenPipeError:
+        pass  # ffmpeg gave up on the input; its exit code and stderr say why
+    finally:
+        stdin.close()
+
+def _input_size(audio) -> int:
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return len(audio)
+    try:
+        return audio.getbuffer().nbytes  # BytesIO / UploadedFile
+    except AttributeError:
+        return -1
+
+def preprocess_audio(audio, mime_type: str = None, fmt: str = "flac", trim_silence: bool = True):
+    """(payload, payload_mime, stats) ready for upload.
+
+    audio is bytes or a binary file object. stats has bytes_in, bytes_out, ms and format. Without an
+    ffmpeg binary the original recording is passed through unchanged (format "original").
+    """
+    t0 = time.perf_counter()
+    bytes_in = _input_size(audio)
+    exe = ffmpeg_path()
+    if exe is None:
+        payload = bytes(audio) if isinstance(audio, (bytes, bytearray, memoryview)) else audio.read()
+        stats = {"bytes_in": len(payload), "bytes_out": len(payload), "ms": 0.0, "format": "original"}
+        return payload, mime_type or "audio/webm", stats
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported format {fmt!r}; expected one of {sorted(FORMATS)}")
+
+    cmd = [exe, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-vn",
+           "-ac", "1", "-ar", str(SAMPLE_RATE)]
+    if trim_silence:
+        cmd += ["-af", SILENCE_FILTER]
+    cmd += ["-c:a", CODECS[fmt], "-f", fmt, "pipe:1"]
+
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    feeder = threading.Thread(target=_feed, args=(proc.stdin, audio), daemon=True)
+    feeder.start()
+    # stderr is tiny at -loglevel error; drain it alongside so ffmpeg never blocks on a full pipe
+    err = []
+    drain = threading.Thread(target=lambda: err.append(proc.stderr.read()), daemon=True)
+    drain.start()
+    out = bytearray()
+    while chunk := proc.stdout.read(CHUNK):
+        out += chunk
+    proc.wait()
+    feeder.join()
+    drain.join()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({proc.returncode}): {b''.join(err).decode(errors='replace').strip()}")
+
+    stats = {
+        "bytes_in": bytes_in,
+        "bytes_out": len(out),
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+        "format": fmt,
+    }
+    return bytes(out), FORMATS[fmt], stats
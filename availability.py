@@ -0,0 +1,85 @@
+# Slot-grid availability per (day, worker).
+# A row is an int bitset of SLOT_MIN slots from DAY_START to DAY_END (bit i = slot i is booked), so
+# "is this worker free from t to t+d" is one mask test and "earliest run of n free slots" is a
+# handful of shift/and steps. Rows are rebuilt only when their column's rev stamp (or, for an unstamped
+# column, its task list object) changes, which with the copy-on-write plan helpers means only the rows
+# an edit touched.
+
+from spa_data import DAY_START, DAY_END, SLOT_MIN
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+def _runs(free: int, n: int) -> int:
+    """Bits i such that slots i .. i+n-1 are all set in `free`."""
+    have = 1
+    while have < n:
+        step = min(have, n - have)
+        free &= free >> step
+        have += step
+    return free
+
+class AvailabilityIndex:
+    def __init__(self, services_index, day_start=DAY_START, day_end=DAY_END, slot_min=SLOT_MIN, gap_field=None):
+        self.durations = {sid: s["duration_min"] for sid, s in services_index.items()}
+        self.day_start = day_start
+        self.slot_min = slot_min
+        self.span_min = _minutes(day_end) - _minutes(day_start)
+        self.n_slots = self.span_min // slot_min
+        self.full = (1 << self.n_slots) - 1
+        self.gap_field = gap_field
+        self._rows = {}  # (day, worker_id) -> (column rev or tasks list it was built from, busy bits, tail offset)
+
+    def _slot_mask(self, start_min, dur_min):
+        first = start_min // self.slot_min
+        last = -(-(start_min + dur_min) // self.slot_min)  # exclusive, rounded up
+        return ((1 << (last - first)) - 1) << first
+
+    def sync(self, day, columns):
+        """Refresh the day's rows from its worker columns; unchanged task lists are skipped."""
+        for col in columns:
+            key = (day, col["worker_id"])
+            row = self._rows.get(key)
+            rev = col.get("rev")
+            if row is not None and (row[0] == rev if rev is not None else row[0] is col["tasks"]):
+                continue
+            busy, cur = 0, 0
+            for t in col["tasks"]:
+                dur = self.durations[t["service_id"]]
+                if cur < self.span_min:
+                    busy |= self._slot_mask(cur, min(dur, self.span_min - cur))
+                cur += dur + (t.get(self.gap_field, 0) if self.gap_field else 0)
+            self._rows[key] = (rev if rev is not None else col["tasks"], busy & self.full, cur)
+
+    def tail(self, day, worker_id):
+        """Offset (minutes after day_start) where the next appended booking would start."""
+        return self._rows[(day, worker_id)][2]
+
+    def is_free(self, day, worker_id, start_min, dur_min):
+        if start_min < 0 or start_min + dur_min > self.span_min:
+            return False
+        return not self._rows[(day, worker_id)][1] & self._slot_mask(start_min, dur_min)
+
+    def earliest_free(self, day, worker_id, dur_min, not_before=0):
+        """Earliest slot-aligned offset >= not_before with dur_min free minutes before closing, or None."""
+        n = -(-dur_min // self.slot_min)
+        first = -(-not_before // self.slot_min)
+        free = ~self._rows[(day, worker_id)][1] & self.full & ~((1 << first) - 1)
+        runs = _runs(free, n) & ((1 << max(self.n_slots - n + 1, 0)) - 1)
+        if not runs:
+            return None
+        return ((runs & -runs).bit_length() - 1) * self.slot_min
+
+    def earliest_free_any(self, day, worker_ids, dur_min, append_only=False):
+        """(worker_id, offset) of the earliest fit across workers; append_only searches after each row's tail."""
+        best = None
+        for wid in worker_ids:
+            start = self.earliest_free(day, wid, dur_min, self.tail(day, wid) if append_only else 0)
+            if start is not None and (best is None or start < best[1]):
+                best = (wid, start)
+        return best
+
+    def clock(self, offset_min):
+        """'HH:MM' for an offset after day_start."""
+        total = _minutes(self.day_start) + offset_min
+        return f"{total // 60:02d}:{total % 60:02d}"
@@ -0,0 +1,403 @@
+"""Benchmarks for the scheduling hot paths on seeded synthetic plans.
+
+    python bench.py                               # default sizes, JSON to stdout
+    python bench.py --sizes 10,1000 --out bench.json
+    python bench.py --compare bench.json          # exit 1 if a case got slower than the tolerance
+
+Every case is timed --repeat times on the same generated input; the JSON keeps median and min ms plus
+case-specific numbers (figure JSON bytes, audio bytes). Streamlit cases import streamlit_app in
+Streamlit's bare mode; audio is skipped when no ffmpeg binary is installed.
+"""
+
+import argparse
+import io
+import json
+import logging
+import math
+import platform
+import random
+import statistics
+import struct
+import sys
+import time
+import wave
+from datetime import date, timedelta
+
+from plotly.io.json import to_json_plotly
+
+from spa_data import WORKERS, SERVICES, DAY_START
+
+DEFAULT_SIZES = (10, 1_000, 10_000, 100_000)
+SYLLABLES = ("ka", "ri", "na", "to", "mi", "su", "de", "wa", "bu", "ci", "la", "yo", "an", "el", "ma", "jo")
+
+# ---------------- generators ----------------
+def customer_names(n, rng):
+    return [" ".join("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).title()
+                     for _ in range(rng.randint(1, 2))) for _ in range(n)]
+
+def generate_plan(n_tasks, worker_ids, days, seed=0, services=SERVICES):
+    """{day_iso: [{"worker_id", "tasks"}]} with n_tasks spread uniformly over days and workers."""
+    rng = random.Random(seed)
+    customers = customer_names(min(max(n_tasks // 4, 8), 5_000), rng)
+    svc_ids = [s["id"] for s in services]
+    plan = {d: {wid: [] for wid in worker_ids} for d in days}
+    for i in range(n_tasks):
+        plan[rng.choice(days)][rng.choice(worker_ids)].append({
+            "id": f"t{i + 1}", "customer": rng.choice(customers), "service_id": rng.choice(svc_ids),
+            "gap_min": rng.choice((15, 20, 30)),
+        })
+    return {d: [{"worker_id": wid, "tasks": plan[d][wid]} for wid in worker_ids] for d in days}
+
+def generate_utterances(n, customers, seed=0):
+    rng = random.Random(seed)
+    forms = ("add a {s} to {w} for customer {c}", "book {c} with {w} for a {s}", "{w} gives {c} a {s}",
+             "customer '{c}' wants {s}", "{c} {s} with {w}, {c2} {s2} with {w2}")
+    words = ("swedish", "thai massage", "deep tissue", "hot stone", "facial", "reflexology", "thay masage")
+    names = [w["name"] for w in WORKERS]
+    return [rng.choice(forms).format(s=rng.choice(words), s2=rng.choice(words), w=rng.choice(names),
+                                     w2=rng.choice(names), c=rng.choice(customers), c2=rng.choice(customers))
+            for _ in range(n)]
+
+def generate_audio(seconds=6.0, rate=48_000, seed=0):
+    """Stereo 16-bit WAV: silence, a warbling tone with pauses, silence (what a voice note looks like)."""
+    rng = random.Random(seed)
+    frames = bytearray()
+    for i in range(int(seconds * rate)):
+        t = i / rate
+        speaking = 0.5 < t < seconds - 1.0 and (t % 1.5) < 1.1
+        v = int(8_000 * math.sin(2 * math.pi * (180 + 40 * math.sin(t * 3)) * t)) if speaking else rng.randint(-20, 20)
+        frames += struct.pack("<hh", v, v)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(bytes(frames))
+    return buf.getvalue()
+
+def today_iso():
+    return date.today().isoformat()
+
+# ---------------- cases ----------------
+# each case(n) returns (run, extra): run() is the timed call, extra holds sizes measured once
+CASES = {}
+
+def case(name):
+    def register(fn):
+        CASES[name] = fn
+        return fn
+    return register
+
+@case("utils.build_schedule_df")
+def bench_utils_schedule(n):
+    from utils import build_schedule_df
+    workers = [{"id": f"w{i + 1}", "name": f"Worker {i + 1}"} for i in range(max(4, min(n // 50, 500)))]
+    plan = generate_plan(n, [w["id"] for w in workers], [today_iso()])
+    state = {"workers": plan[today_iso()]}
+    services_idx = {s["id"]: s for s in SERVICES}
+    workers_idx = {w["id"]: w for w in workers}
+    return (lambda: build_schedule_df(state, services_idx, workers_idx, DAY_START)), {"workers": len(workers)}
+
+def dash_state(n):
+    from plan_state import column
+    plan = generate_plan(n, [w["id"] for w in WORKERS], [today_iso()])
+    return {"seq": n, "workers": [column(c["worker_id"], c["tasks"]) for c in plan[today_iso()]]}
+
+def store_data(state):
+    """The `state` store value the Dash callbacks receive: the plan packed, as the app keeps it."""
+    from plan_codec import pack_state
+    return pack_state(state)
+
+def ops_event(*ops):
+    return {"type": "gantt-ops", "detail": {"seq": 1, "ops": [{"op": i + 1, **op} for i, op in enumerate(ops)]}}
+
+def drop_op(state, dest_index=-1):
+    src = next(c for c in state["workers"] if c["tasks"])
+    dest = WORKERS[dest_index] if src["worker_id"] != WORKERS[dest_index]["id"] else WORKERS[0]
+    return {"kind": "drop", "taskId": src["tasks"][0]["id"],
+            "fromWorkerName": next(w["name"] for w in WORKERS if w["id"] == src["worker_id"]),
+            "dropWorkerName": dest["name"], "dropXISO": f"{today_iso()}T12:00:00.000Z"}
+
+@case("dash.add_booking")
+def bench_add_booking(n):
+    import app
+    state = dash_state(n)
+    event = ops_event({"kind": "add", "customer": "Bench", "service_id": "svc_thai", "worker_id": "w1"})
+    data = store_data(state)
+    return (lambda: app.apply_ops(event, data)), {}
+
+@case("dash.on_gantt_drop")
+def bench_gantt_drop(n):
+    import app
+    state = dash_state(max(n, 2))
+    event = ops_event(drop_op(state))
+    data = store_data(state)
+    return (lambda: app.apply_ops(event, data)), {}
+
+@case("dash.apply_ops.burst")
+def bench_ops_burst(n):
+    """Ten quick interactions (drags and bookings) arriving as one queued batch."""
+    import app
+    state = dash_state(max(n, 2))
+    ops = [drop_op(state, i % len(WORKERS)) if i % 2 else
+           {"kind": "add", "customer": f"Bench {i}", "service_id": "svc_thai", "worker_id": "w1"} for i in range(10)]
+    event = ops_event(*ops)
+    data = store_data(state)
+    return (lambda: app.apply_ops(event, data)), {}
+
+def figure_json(fig):
+    """The response body Dash sends for a figure output (same encoder, orjson when installed)."""
+    return to_json_plotly(fig.to_plotly_json() if hasattr(fig, "to_plotly_json") else fig)
+
+# the update_gantt cases time the callback plus its JSON encoding: both are paid on every edit
+@case("dash.update_gantt")
+def bench_update_gantt(n):
+    import app
+    data = store_data(dash_state(n))
+    return (lambda: figure_json(app.update_gantt(data))), {"json_bytes": len(figure_json(app.update_gantt(data)))}
+
+@case("dash.update_gantt.patch")
+def bench_update_gantt_patch(n):
+    import app
+    data = store_data({**dash_state(n), "touched": ["w1"]})
+    return (lambda: figure_json(app.update_gantt(data))), {"json_bytes": len(figure_json(app.update_gantt(data)))}
+
+@case("dash.update_gantt.edit")
+def bench_update_gantt_edit(n):
+    """Full redraw right after one column changed: only that row is rebuilt, the rest come from cache."""
+    import app
+    from plan_state import new_rev
+    data = store_data(dash_state(n))
+    app.update_gantt(data)
+
+    def run():
+        data["packed"]["rows"][0][1] = new_rev()  # the first column as an edit left it: same tasks, new rev
+        return figure_json(app.update_gantt(data))
+    before = app.frame_parts.builds
+    run()
+    return run, {"rows_built": app.frame_parts.builds - before}
+
+_streamlit = None
+
+class BareModeFilter(logging.Filter):
+    """Drops the "missing ScriptRunContext" warning bare mode logs on every session_state access."""
+
+    def filter(self, record):
+        return "missing ScriptRunContext" not in str(record.msg)
+
+def quiet_streamlit():
+    # a level alone does not stick: Streamlit re-applies its configured log level once its config loads,
+    # so every streamlit logger also gets a filter, or the warnings would dominate the timings
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logger = logging.getLogger(name)
+            logger.setLevel(logging.ERROR)
+            if not any(isinstance(f, BareModeFilter) for f in logger.filters):
+                logger.addFilter(BareModeFilter())
+
+def streamlit_module():
+    """streamlit_app imported once in bare mode (its UI calls become no-ops)."""
+    global _streamlit
+    if _streamlit is None:
+        import streamlit  # noqa: F401  (creates the loggers)
+        quiet_streamlit()
+        import streamlit_app
+        quiet_streamlit()
+        _streamlit = streamlit_app
+    return _streamlit
+
+def load_streamlit_plan(n, days):
+    from plan_state import TaskIndex
+    import streamlit as st
+    sa = streamlit_module()
+    start = date.today()
+    day_isos = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    plan = generate_plan(n, [w["id"] for w in sa.WORKERS], day_isos, services=sa.SERVICES)
+    st.session_state.plan_by_day = plan
+    st.session_state.task_index = TaskIndex(plan)
+    st.session_state.day_frames.clear()
+    st.session_state.row_parts.clear()
+    st.session_state.view_cache.clear()
+    return sa, start, plan
+
+@case("streamlit.build_schedule_df.cold")
+def bench_st_schedule_cold(n):
+    import streamlit as st
+    sa, start, _ = load_streamlit_plan(n, 7)
+
+    def run():
+        st.session_state.day_frames.clear()
+        st.session_state.row_parts.clear()
+        return sa.build_schedule_df(start, 7)
+    return run, {"days": 7}
+
+@case("streamlit.build_schedule_df.one_day_changed")
+def bench_st_schedule_warm(n):
+    import streamlit as st
+    from plan_state import column
+    sa, start, plan = load_streamlit_plan(n, 7)
+    sa.build_schedule_df(start, 7)
+    day = start.isoformat()
+
+    def run():
+        cols = list(plan[day])
+        cols[0] = column(cols[0]["worker_id"], cols[0]["tasks"])  # one edited worker, as the app stamps it
+        st.session_state.plan_by_day = {**st.session_state.plan_by_day, day: cols}
+        return sa.build_schedule_df(start, 7)
+    return run, {"days": 7}
+
+@case("streamlit.find_task")
+def bench_find_task(n):
+    sa, start, plan = load_streamlit_plan(max(n, 1), 7)
+    ids = [(d, t["id"]) for d, cols in plan.items() for c in cols for t in c["tasks"]]
+    picks = random.Random(1).choices(ids, k=1_000)
+    return (lambda: [sa.find_task(d, tid) for d, tid in picks]), {"lookups": len(picks)}
+
+@case("plan_codec.pack_state")
+def bench_pack_state(n):
+    """Dash state to the packed JSON text the browser store carries, against the plain JSON form."""
+    from plan_codec import pack_state
+    from session_store import dumps
+    state = dash_state(n)
+    return (lambda: dumps(pack_state(state))), {"json_bytes": len(dumps(state)),
+                                                 "packed_bytes": len(dumps(pack_state(state)))}
+
+@case("plan_codec.unpack_state")
+def bench_unpack_state(n):
+    from plan_codec import pack_state, unpack_state
+    from session_store import dumps, loads
+    text = dumps(pack_state(dash_state(n)))
+    return (lambda: unpack_state(loads(text))), {}
+
+@case("plan_codec.park_month")
+def bench_park_month(n):
+    """Parking a month of 100 staff as PackedDays; the extras are traced heap bytes of both forms."""
+    import tracemalloc
+    from plan_codec import PackedDay, PlanTables
+    from plan_state import column
+    days = [(date.today() + timedelta(days=i)).isoformat() for i in range(30)]
+    worker_ids = [f"w{i}" for i in range(1, 101)]
+    tracemalloc.start()
+    plan = {d: [column(c["worker_id"], c["tasks"]) for c in cols]
+            for d, cols in generate_plan(n, worker_ids, days).items()}
+    plain_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    tables = PlanTables()
+    parked = {d: PackedDay(cols, tables) for d, cols in plan.items()}
+    packed_bytes = tracemalloc.get_traced_memory()[0] - plain_bytes
+    tracemalloc.stop()
+    del parked
+    return (lambda: {d: PackedDay(cols, PlanTables()) for d, cols in plan.items()}), {
+        "plain_bytes": plain_bytes, "packed_bytes": packed_bytes}
+
+@case("interpret_command")
+def bench_interpret(n):
+    from command_parser import CommandParser
+    from fuzzy_index import FuzzyIndex, normalize
+    rng = random.Random(2)
+    customers = customer_names(min(max(n // 4, 8), 5_000), rng)
+    index = FuzzyIndex({normalize(c): c for c in customers})
+    parser = CommandParser(SERVICES, WORKERS)
+    utterances = generate_utterances(200, customers)
+    return (lambda: [parser.parse_all(u, index) for u in utterances]), {"utterances": len(utterances),
+                                                                         "customers": len(index)}
+
+@case("interpret_command.replay")
+def bench_interpret_replay(n):
+    """A log of utterances (with the repeats a real log has) replayed through parse_many on a fresh parser."""
+    from command_parser import CommandParser
+    if n != min(ARGS.sizes):
+        return None  # size-independent
+    rng = random.Random(3)
+    log = rng.choices(generate_utterances(200, customer_names(50, rng)), k=1_000)
+    return (lambda: CommandParser(SERVICES, WORKERS).parse_many(log)), {"utterances": len(log)}
+
+@case("preprocess_audio")
+def bench_audio(n):
+    from audio_prep import ffmpeg_path, preprocess_audio
+    if n != min(ARGS.sizes) or ffmpeg_path() is None:
+        return None  # size-independent; run once, and only with ffmpeg
+    audio = generate_audio()
+    _, _, stats = preprocess_audio(audio, "audio/wav")
+    return (lambda: preprocess_audio(audio, "audio/wav")), {"bytes_in": stats["bytes_in"], "bytes_out": stats["bytes_out"]}
+
+# ---------------- harness ----------------
+def time_case(run, repeat):
+    run()  # warm-up: imports, caches, JIT-free but first-call allocations
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return {"median_ms": round(statistics.median(samples), 3), "min_ms": round(min(samples), 3)}
+
+def run_all(sizes, repeat, only=None):
+    results = []
+    for name, make in CASES.items():
+        if only and not any(o in name for o in only):
+            continue
+        for n in sizes:
+            try:
+                made = make(n)
+            except ImportError as e:
+                print(f"skip {name}: {e}", file=sys.stderr)
+                break
+            if made is None:
+                continue
+            run, extra = made
+            row = {"case": name, "n": n, **time_case(run, repeat), **extra}
+            print(f"{name:45s} n={n:<7d} {row['median_ms']:10.3f} ms", file=sys.stderr)
+            results.append(row)
+    return results
+
+def compare(results, baseline, tolerance):
+    """Cases whose median (or figure JSON size) grew by more than tolerance over the baseline."""
+    base = {(r["case"], r["n"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = base.get((r["case"], r["n"]))
+        if not b:
+            continue
+        for metric in ("median_ms", "json_bytes"):
+            if metric in r and b.get(metric) and r[metric] > b[metric] * (1 + tolerance) and \
+                    (metric != "median_ms" or r[metric] - b[metric] > 0.05):  # ignore sub-50µs noise
+                regressions.append({"case": r["case"], "n": r["n"], "metric": metric,
+                                    "baseline": b[metric], "current": r[metric],
+                                    "ratio": round(r[metric] / b[metric], 2)})
+    return regressions
+
+def main(argv=None):
+    global ARGS
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=list(DEFAULT_SIZES),
+                   help="comma-separated task counts (default %(default)s)")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--only", type=lambda s: s.split(","), help="run cases whose name contains any of these")
+    p.add_argument("--out", help="write the JSON report here instead of stdout")
+    p.add_argument("--compare", help="baseline JSON report to check against")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown ratio (default 0.25)")
+    ARGS = p.parse_args(argv)
+
+    report = {
+        "python": platform.python_version(), "platform": platform.platform(),
+        "sizes": ARGS.sizes, "repeat": ARGS.repeat,
+        "results": run_all(ARGS.sizes, ARGS.repeat, ARGS.only),
+    }
+    if ARGS.compare:
+        with open(ARGS.compare) as f:
+            report["regressions"] = compare(report["results"], json.load(f), ARGS.tolerance)
+        for r in report["regressions"]:
+            print(f"REGRESSION {r['case']} n={r['n']} {r['metric']}: {r['baseline']} -> {r['current']} "
+                  f"(x{r['ratio']})", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if ARGS.out:
+        with open(ARGS.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if report.get("regressions") else 0
+
+ARGS = None
+
+if __name__ == "__main__":
+    sys.exit(main())
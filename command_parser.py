@@ -0,0 +1,168 @@
+# Voice/text booking commands -> {"action", "service_id", "worker_id", "customer"}.
+# Everything is compiled once per catalog: a single regex scanned once over the utterance finds the
+# customer phrase, the "with/to <name>" worker hint and every service-alias mention;
+# lookups then go through precomputed lowercase name -> record maps. Fuzzy matching (a blocked
+# FuzzyIndex per catalog) is only the fallback when nothing was mentioned verbatim.
+
+import re
+
+from assign import AUTO
+from fuzzy_index import FuzzyIndex
+
+SERVICE_ALIASES = {
+    "swedish": "Swedish Massage",
+    "swedish massage": "Swedish Massage",
+    "thai": "Thai Massage",
+    "thai massage": "Thai Massage",
+    "deep tissue": "Deep Tissue",
+    "hot stone": "Hot Stone",
+    "facial": "Facial Treatment",
+    "facial treatment": "Facial Treatment",
+    "reflexology": "Reflexology",
+}
+
+NAME = r"[A-Za-z][A-Za-z\-]+(?:\s+[A-Za-z][A-Za-z\-]+)?"
+# alternatives in priority order; every one sits inside a lookahead, so the scan visits each position
+# once and records the first alternative that matches there without consuming the text
+CLAUSES = (
+    r'customer\s+"(?P<cq>[^"]+)"',
+    r"customer\s+'(?P<cs>[^']+)'",
+    rf"customer\s+(?P<cw>{NAME})",
+    rf"\bbook\s+(?P<book>{NAME})\b",
+    rf"\bgives\s+(?P<gives>{NAME})\b",
+    r"\bwith\s+(?P<with>[A-Za-z]+)\b",
+    r"\bto\s+(?P<to>[A-Za-z]+)\b",
+)
+CUSTOMER_KINDS = ("cq", "cs", "cw", "book", "gives")
+WORKER_HINT_KINDS = ("with", "to")
+# "Ali thai with Ayu, Maya facial with Budi and Tom reflexology with Citra" -> one clause per booking
+CLAUSE_SPLIT = re.compile(r"\s*(?:[,;]|\.\s|\band then\b|\bthen\b|\band\b|\balso\b|\bplus\b)\s*", re.IGNORECASE)
+# words that can open a clause without being part of a customer's name
+LEAD_STOPWORDS = {"add", "please", "book", "a", "an", "the", "for", "and", "then", "also", "plus", "new",
+                  "booking", "one", "get", "wants", "want", "needs", "customer", "client"}
+_WORD = re.compile(r"[A-Za-z][A-Za-z\-]*")
+
+def _alternation(words) -> str:
+    # longest first so "thai massage" wins over "thai" at the same position
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+class CommandParser:
+    def __init__(self, services, workers, aliases=SERVICE_ALIASES):
+        self.services_by_name = {s["name"].lower(): s for s in services}
+        self.worker_index = FuzzyIndex()
+        self.update_workers(workers)
+        # alias -> service record; the first alias (in table order) that appears anywhere wins
+        self.alias_to_service = {}
+        for alias, canon in aliases.items():
+            if canon.lower() in self.services_by_name:
+                self.alias_to_service.setdefault(alias.lower(), self.services_by_name[canon.lower()])
+        for name, svc in self.services_by_name.items():
+            self.alias_to_service.setdefault(name, svc)
+        self.alias_rank = {alias: i for i, alias in enumerate(self.alias_to_service)}
+        self.service_index = FuzzyIndex({alias: alias for alias in self.alias_to_service})
+
+        clauses = list(CLAUSES)
+        clauses.append(rf"\b(?P<svc>{_alternation(self.alias_to_service)})\b")
+        # cheap first-letter gate so most positions are rejected before any alternative is tried
+        firsts = "cbgwt" + "".join(sorted({a[0] for a in self.alias_to_service}))
+        self.pattern = re.compile(
+            f"(?=[{re.escape(firsts)}])(?=" + "|".join(f"(?:{c})" for c in clauses) + ")", re.IGNORECASE)
+        self._memo = {}
+
+    def update_workers(self, workers):
+        """Staff changed: refresh the name maps and re-index only the workers that changed."""
+        self.workers_by_id = {w["id"]: w for w in workers}
+        self.workers_by_name = {w["name"].lower(): w for w in workers}
+        self.worker_index.sync({w["id"]: w["name"] for w in workers})
+        self._memo = {}
+
+    def scan(self, text: str) -> dict:
+        """{kind: first captured text} plus "svc_hits" (aliases seen) from one pass over text."""
+        found, svc_hits = {}, []
+        for m in self.pattern.finditer(text):
+            kind = m.lastgroup
+            if kind == "svc":
+                if not svc_hits:
+                    found["svc_at"] = m.start()
+                svc_hits.append(m.group(kind).lower())
+            elif kind not in found:
+                found[kind] = m.group(kind)
+        found["svc_hits"] = svc_hits
+        return found
+
+    def service(self, text: str, svc_hits=()):
+        if svc_hits:
+            return self.alias_to_service[min(svc_hits, key=self.alias_rank.__getitem__)]
+        key, _, _ = self.service_index.match(text, cutoff=80)
+        return self.alias_to_service.get(key)
+
+    def lead_customer(self, prefix: str):
+        """The words before the service ("Maya facial with Budi") as a customer name, if they look like one."""
+        words = [w for w in _WORD.findall(prefix)
+                 if w.lower() not in LEAD_STOPWORDS and w.lower() not in self.workers_by_name]
+        return " ".join(words) if 1 <= len(words) <= 3 else None
+
+    def worker(self, text: str):
+        exact = self.workers_by_name.get(text.lower())
+        if exact is not None:
+            return exact
+        key, _, _ = self.worker_index.match(text, cutoff=80)
+        return self.workers_by_id.get(key)
+
+    def parse(self, utterance: str, customers: FuzzyIndex = None, customer_cutoff: float = 88, lead: bool = False):
+        """customers (display names of known clients) snaps a heard name to its existing spelling;
+        lead also takes a bare name before the service as the customer (clauses of parse_all)."""
+        t = utterance.strip()
+        found = self.scan(t)
+
+        # customer (quoted; or after "customer"; or after "book"/"gives")
+        customer = next((found[k].strip() for k in CUSTOMER_KINDS if k in found), None)
+        if not customer and lead and found.get("svc_at"):
+            customer = self.lead_customer(t[:found["svc_at"]])
+        if customer and customers is not None and len(customers):
+            # whole-name score: a new "Ali" must not be filed under an existing "Alina"
+            _, known, _ = customers.match(customer, cutoff=customer_cutoff, whole=True)
+            customer = known or customer
+
+        # worker (with/to <name> … else fuzzy on whole)
+        hint = next((found[k] for k in WORKER_HINT_KINDS if k in found), None)
+        worker = self.worker(hint if hint is not None else t)
+
+        # service (aliases/fuzzy)
+        service = self.service(t, found["svc_hits"])
+
+        # no therapist named -> let the assignment engine pick one
+        if service and customer:
+            return {"action": "add", "service_id": service["id"], "worker_id": worker["id"] if worker else AUTO,
+                    "customer": customer}
+        return None
+
+    def parse_all(self, utterance: str, customers: FuzzyIndex = None):
+        """(commands, unparsed clauses) for an utterance that may book several people at once.
+
+        The text is split into clauses only when at least two of them parse on their own; otherwise it
+        is read as a single command, exactly like parse().
+        """
+        t = utterance.strip()
+        clauses = [c for c in CLAUSE_SPLIT.split(t) if c.strip()]
+        if len(clauses) > 1 and '"' not in t and "'" not in t:
+            parsed = [(c, self.parse(c, customers, lead=True)) for c in clauses]
+            cmds = [cmd for _, cmd in parsed if cmd]
+            if len(cmds) >= 2:
+                return cmds, [c for c, cmd in parsed if not cmd]
+        cmd = self.parse(t, customers)
+        return ([cmd], []) if cmd else ([], [t] if t else [])
+
+    def parse_many(self, utterances, customers: FuzzyIndex = None) -> list:
+        """parse() over a batch (e.g. a replay of logged utterances); repeated lines are parsed once."""
+        if customers is not None:
+            return [self.parse(u, customers) for u in utterances]  # customer set may change between calls
+        out = []
+        for u in utterances:
+            if u not in self._memo:
+                if len(self._memo) >= 10_000:
+                    self._memo.clear()
+                self._memo[u] = self.parse(u)
+            cmd = self._memo[u]
+            out.append(dict(cmd) if cmd else cmd)
+        return out
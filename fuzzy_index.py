@@ -0,0 +1,117 @@
+# Prebuilt fuzzy-matching index for staff, services and returning customers.
+# Names are normalized once (casefold, accents stripped, punctuation collapsed) and split into padded
+# character trigrams with an inverted gram -> keys posting list. A query first shortlists the entries
+# whose grams it covers best (blocking), then only that shortlist is scored with rapidfuzz WRatio, or
+# difflib's ratio when rapidfuzz is missing. match(whole=True) scores whole names instead (token order
+# ignored): WRatio rates a prefix such as "Ali" in "Alina" at 90, which is no use for telling people apart.
+# add/remove/sync keep the postings current without a rebuild.
+
+import heapq
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+try:
+    from rapidfuzz import fuzz, process
+except Exception:  # difflib fallback below, same blocking
+    fuzz = process = None
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+def normalize(name: str) -> str:
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode().casefold()
+    return _NON_ALNUM.sub(" ", text).strip()
+
+def grams(norm: str, n: int = 3) -> set:
+    padded = f" {norm} "
+    return {padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+class FuzzyIndex:
+    """key -> display name; match() returns (key, name, score) or (None, None, 0)."""
+
+    def __init__(self, items=None, n: int = 3, shortlist: int = 32):
+        self.n, self.shortlist_size = n, shortlist
+        self.names = {}    # key -> display name
+        self._norm = {}    # key -> normalized name
+        self._grams = {}   # key -> grams of the normalized name
+        self._order = {}   # key -> insertion counter; ties go to the earlier entry
+        self._added = 0
+        self._postings = defaultdict(set)
+        if items:
+            self.sync(items)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, key):
+        return key in self.names
+
+    # ---- maintenance ----
+    def add(self, key, name: str):
+        if self.names.get(key) == name:
+            return
+        if key in self.names:
+            self.remove(key)
+        norm = normalize(name)
+        g = grams(norm, self.n)
+        self.names[key], self._norm[key], self._grams[key] = name, norm, g
+        self._order[key] = self._added
+        self._added += 1
+        for gram in g:
+            self._postings[gram].add(key)
+
+    def remove(self, key):
+        if key not in self.names:
+            return
+        for gram in self._grams.pop(key):
+            keys = self._postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+        del self.names[key], self._norm[key], self._order[key]
+
+    def sync(self, items: dict):
+        """Make the index hold exactly items ({key: name}); only changed keys are touched."""
+        for key in [k for k in self.names if k not in items]:
+            self.remove(key)
+        for key, name in items.items():
+            self.add(key, name)
+
+    # ---- lookup ----
+    def shortlist(self, norm_query: str) -> list:
+        """Keys whose grams the query covers best (fraction of the entry's grams present).
+
+        A catalog no bigger than the shortlist is returned whole: blocking would only cost time there.
+        """
+        if len(self.names) <= self.shortlist_size:
+            return list(self._norm)
+        shared = defaultdict(int)
+        for gram in grams(norm_query, self.n):
+            for key in self._postings.get(gram, ()):
+                shared[key] += 1
+        return heapq.nsmallest(self.shortlist_size, shared,
+                               key=lambda k: (-shared[k] / len(self._grams[k]), self._order[k]))
+
+    def match(self, query: str, cutoff: float = 80, whole: bool = False):
+        norm_query = normalize(query)
+        if not norm_query:
+            return None, None, 0
+        candidates = self.shortlist(norm_query)
+        if not candidates:
+            return None, None, 0
+        candidates.sort(key=self._order.__getitem__)  # catalog order decides equal scores
+        if process is not None:
+            best = process.extractOne(norm_query, {k: self._norm[k] for k in candidates},
+                                      scorer=fuzz.token_sort_ratio if whole else fuzz.WRatio, score_cutoff=cutoff)
+            if not best:
+                return None, None, 0
+            _, score, key = best
+        else:
+            sort = (lambda n: " ".join(sorted(n.split()))) if whole else (lambda n: n)
+            scores = {k: SequenceMatcher(None, sort(norm_query), sort(self._norm[k])).ratio() * 100 for k in candidates}
+            key = max(candidates, key=scores.__getitem__)  # first of equal scores, as candidates are ordered
+            score = scores[key]
+            if score < cutoff:
+                return None, None, 0
+        return key, self.names[key], score
@@ -0,0 +1,185 @@
+# Gantt figures shared by the Dash app and the Streamlit planner.
+# One trace per service, always in SERVICES order, so a trace's index never moves and an edit can be
+# shipped as a Patch of just the traces whose bars changed.
+#   - "svg":   horizontal bar traces with inside labels (the classic px.timeline look)
+#   - "webgl": each service is one Scattergl of thick line segments, one segment per bar; customer
+#              labels live in a trailing text trace that is only filled while few bars are in view
+# compact=True (the Dash app) ships numeric arrays as plotly.js typed arrays ({"dtype", "bdata"}, base64
+# of the raw little-endian buffer) with times as epoch milliseconds, and the figure as a plain dict so
+# nothing is re-validated; string columns go out as plain lists that orjson encodes without a cleaning pass.
+
+import base64
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+HOVER = "%{text}<br>%{customdata[1]} • %{customdata[0]}"
+TASK_HOVER = "%{text}<br>%{y} • %{customdata}"  # customdata_cols=("TaskId",): the worker is the bar's y
+EMPTY_TITLE = "No bookings yet."
+RENDERERS = ("svg", "webgl")
+GL_LABEL_LIMIT = 150  # the webgl label trace is drawn only when at most this many bars are in view
+
+def pack(values, dtype: str) -> dict:
+    """A plotly.js typed array: dtype is one of its codes ("f8", "i4", ...)."""
+    arr = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+    return {"dtype": dtype, "bdata": base64.b64encode(arr.tobytes()).decode("ascii")}
+
+def records(rows: pd.DataFrame, customdata_cols) -> list:
+    """customdata as lists; a single column goes out flat (["t1", ...]) rather than as one-item rows."""
+    if len(customdata_cols) == 1:
+        return rows[customdata_cols[0]].tolist()
+    return rows[list(customdata_cols)].to_numpy().tolist()
+
+def epoch_ms(times) -> np.ndarray:
+    """Naive datetimes as float ms since the epoch; a date axis reads them as the same wall-clock time."""
+    return np.asarray(times, dtype="datetime64[ms]").astype(np.int64).astype(np.float64)
+
+def trace_arrays(rows: pd.DataFrame, customdata_cols=("TaskId", "Worker"), compact=False) -> dict:
+    """The per-bar arrays of one service trace; customdata is [TaskId, Worker] for gantt-dnd.js."""
+    if compact:
+        return {
+            "base": pack(epoch_ms(rows["Start"].to_numpy()), "f8"),
+            "x": pack(rows["Duration(min)"].to_numpy() * 60_000, "i4"),
+            "y": rows["Worker"].tolist(),
+            "customdata": records(rows, customdata_cols),
+            "text": rows["Customer"].tolist(),
+        }
+    return {
+        "base": rows["Start"].to_numpy(),
+        "x": (rows["Duration(min)"] * 60_000).to_numpy(),  # bar length in ms on the date axis
+        "y": rows["Worker"].to_numpy(),
+        "customdata": rows[list(customdata_cols)].to_numpy(),
+        "text": rows["Customer"].to_numpy(),
+    }
+
+def segment_arrays(rows: pd.DataFrame, customdata_cols=("TaskId", "Worker"), compact=False) -> dict:
+    """Line-segment arrays for a webgl trace: start, middle, finish and a None break per bar.
+
+    Every vertex of a bar carries that bar's customdata, so hover/click/drag resolve to the same
+    [TaskId, ...] row as the svg bars do. Compact x is epoch ms with NaN as the break.
+    """
+    n = len(rows)
+    start = rows["Start"].to_numpy(dtype="datetime64[ns]")
+    finish = rows["Finish"].to_numpy(dtype="datetime64[ns]")
+    if compact:
+        x = np.full(4 * n, np.nan)
+        x[0::4], x[2::4] = epoch_ms(start), epoch_ms(finish)
+        x[1::4] = (x[0::4] + x[2::4]) / 2
+        arrays = {"x": pack(x, "f8")}
+    else:
+        x = np.full(4 * n, None, dtype=object)
+        x[0::4] = np.datetime_as_string(start, unit="m")
+        x[1::4] = np.datetime_as_string(start + (finish - start) // 2, unit="m")
+        x[2::4] = np.datetime_as_string(finish, unit="m")
+        arrays = {"x": x}
+    for key, values in (("y", rows["Worker"].to_numpy()), ("text", rows["Customer"].to_numpy())):
+        out = np.full(4 * n, None, dtype=object)
+        for k in range(3):
+            out[k::4] = values
+        arrays[key] = out
+    cd = np.full(4 * n, None, dtype=object)
+    values = records(rows, customdata_cols)
+    for k in range(3):
+        cd[k::4] = values
+    arrays["customdata"] = cd
+    if compact:
+        arrays.update((key, arrays[key].tolist()) for key in ("y", "text", "customdata"))
+    return arrays
+
+def label_arrays(rows: pd.DataFrame, customdata_cols=("TaskId", "Worker"), compact=False) -> dict:
+    """Arrays for the webgl label trace, emptied when too many bars would be labelled."""
+    if len(rows) > GL_LABEL_LIMIT:
+        rows = rows.iloc[:0]
+    if compact:
+        return {
+            "x": pack(epoch_ms(rows["Start"].to_numpy()), "f8"),
+            "y": rows["Worker"].tolist(),
+            "text": rows["Customer"].tolist(),
+            "customdata": records(rows, customdata_cols),
+        }
+    return {
+        "x": np.datetime_as_string(rows["Start"].to_numpy(dtype="datetime64[ns]"), unit="m"),
+        "y": rows["Worker"].to_numpy(),
+        "text": rows["Customer"].to_numpy(),
+        "customdata": rows[list(customdata_cols)].to_numpy(),
+    }
+
+def timeline_figure(df: pd.DataFrame, services, worker_names, height=760, renderer="svg",
+                    customdata_cols=("TaskId", "Worker"), hovertemplate=HOVER, compact=False):
+    """go.Figure, or with compact a plain figure dict whose arrays are filled in after validation."""
+    colors = px.colors.qualitative.Plotly
+    by_service = dict(tuple(df.groupby("Service", sort=False))) if not df.empty else {}
+    bar_px = max(4, int(0.6 * (height - 60) / max(len(worker_names), 1)))
+    arrays = []  # per trace, in trace order
+    fig = go.Figure()
+    for i, svc in enumerate(services):
+        rows = by_service.get(svc["name"], df.iloc[:0])
+        common = dict(name=svc["name"], legendgroup=svc["name"], showlegend=not rows.empty,
+                      hovertemplate=hovertemplate)
+        if renderer == "webgl":
+            arrays.append(segment_arrays(rows, customdata_cols, compact))
+            trace = go.Scattergl(
+                mode="lines", line=dict(color=colors[i % len(colors)], width=bar_px), connectgaps=False, **common,
+            )
+        else:
+            arrays.append(trace_arrays(rows, customdata_cols, compact))
+            trace = go.Bar(
+                orientation="h", marker_color=colors[i % len(colors)],
+                textposition="inside", insidetextanchor="start", textfont_size=12, cliponaxis=False, **common,
+            )
+        fig.add_trace(trace if compact else trace.update(arrays[-1]))
+    if renderer == "webgl":
+        arrays.append(label_arrays(df, customdata_cols, compact))
+        trace = go.Scatter(
+            mode="text", textposition="middle right", textfont_size=12, showlegend=False,
+            hovertemplate=hovertemplate, name="labels",
+        )
+        fig.add_trace(trace if compact else trace.update(arrays[-1]))
+    fig.update_xaxes(type="date")
+    fig.update_yaxes(autorange="reversed", categoryorder="array", categoryarray=list(worker_names))
+    fig.update_layout(
+        title_text=EMPTY_TITLE if df.empty else "",
+        barmode="overlay", legend_title_text="Service", hovermode="closest",
+        margin=dict(l=20, r=20, t=40, b=20), height=height,
+    )
+    if not compact:
+        return fig
+    figure = fig.to_plotly_json()
+    for trace, values in zip(figure["data"], arrays):
+        trace.update(values)
+    return figure
+
+def patch_figure(df: pd.DataFrame, services, touched_workers, renderer="svg",
+                 customdata_cols=("TaskId", "Worker"), compact=False):
+    """Rewrite only the traces holding bars of the touched worker rows; layout and colors stay put."""
+    from dash import Patch  # Dash-only; the Streamlit planner never patches
+
+    patched = Patch()
+    touched_services = set(df.loc[df["Worker"].isin(touched_workers), "Service"])
+    arrays = segment_arrays if renderer == "webgl" else trace_arrays
+    for i, svc in enumerate(services):
+        if svc["name"] not in touched_services:
+            continue
+        rows = df[df["Service"] == svc["name"]]
+        for key, values in arrays(rows, customdata_cols, compact).items():
+            patched["data"][i][key] = values
+        patched["data"][i]["showlegend"] = True
+    if renderer == "webgl":
+        for key, values in label_arrays(df, customdata_cols, compact).items():
+            patched["data"][len(services)][key] = values
+    patched["layout"]["title"]["text"] = EMPTY_TITLE if df.empty else ""
+    return patched
+
+def patch_labels(df: pd.DataFrame, services, x_range, customdata_cols=("TaskId", "Worker"), compact=False):
+    """Refill the webgl label trace for a zoom window [x0, x1]; None means the full range."""
+    from dash import Patch
+
+    if x_range is not None:
+        x0, x1 = pd.to_datetime(x_range[0]), pd.to_datetime(x_range[1])
+        df = df[(df["Finish"] >= x0) & (df["Start"] <= x1)]
+    patched = Patch()
+    for key, values in label_arrays(df, customdata_cols, compact).items():
+        patched["data"][len(services)][key] = values
+    return patched
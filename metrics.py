@@ -0,0 +1,144 @@
+# Opt-in timing and payload-size instrumentation for both apps (METRICS=1).
+# Wall times go into per-name histograms with fixed buckets plus a short window of recent samples for
+# p50/p95; payload sizes (state store, figure JSON) and task counts are kept as last/sum/count. The
+# registry is process-wide and thread-safe; render_prometheus() is the text for a /metrics route and
+# snapshot() feeds the Streamlit debug panel. With METRICS unset every hook is a no-op.
+
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("METRICS", "").lower() in ("1", "true", "yes", "on")
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WINDOW = 256
+
+_lock = threading.Lock()
+_timings = {}  # (name, outcome) -> {"buckets": [...], "sum", "count", "recent": deque}
+_sizes = {}    # (name, kind) -> {"last", "sum", "count", "max"}
+_gauges = {}   # (name, kind) -> value
+
+def observe(name: str, seconds: float, outcome: str = "ok"):
+    if not ENABLED:
+        return
+    with _lock:
+        h = _timings.get((name, outcome))
+        if h is None:
+            h = _timings[(name, outcome)] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0,
+                                             "recent": deque(maxlen=WINDOW)}
+        for i, le in enumerate(BUCKETS):
+            if seconds <= le:
+                h["buckets"][i] += 1
+        h["sum"] += seconds
+        h["count"] += 1
+        h["recent"].append(seconds)
+
+def record_bytes(name: str, kind: str, nbytes: int):
+    if not ENABLED:
+        return
+    with _lock:
+        s = _sizes.setdefault((name, kind), {"last": 0, "sum": 0, "count": 0, "max": 0})
+        s["last"], s["sum"], s["count"], s["max"] = nbytes, s["sum"] + nbytes, s["count"] + 1, max(s["max"], nbytes)
+
+def set_gauge(name: str, kind: str, value):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[(name, kind)] = value
+
+def json_size(obj) -> int:
+    """Serialized size as the browser receives it (plotly figures, Dash Patch objects, plain JSON)."""
+    from plotly.io.json import to_json_plotly  # the encoder Dash itself uses (orjson when installed)
+    if hasattr(obj, "to_plotly_json"):
+        obj = obj.to_plotly_json()
+    return len(to_json_plotly(obj))
+
+@contextmanager
+def timed(name: str):
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException as e:
+        outcome = "skipped" if type(e).__name__ in ("PreventUpdate", "RerunException", "StopException") else "error"
+        raise
+    finally:
+        observe(name, time.perf_counter() - t0, outcome)
+
+def instrument(name: str, payload: str = None):
+    """Decorator: time every call; payload="state"/"figure" also records the result's JSON size."""
+    def deco(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                result = fn(*args, **kwargs)
+            if payload:
+                record_bytes(name, payload, json_size(result))
+            return result
+        return wrapper
+    return deco
+
+# ---- export ----
+def _escape(value) -> str:
+    # label values in the text format escape backslash, double quote and line feed
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**kv) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in kv.items()) + "}"
+
+def render_prometheus() -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    out = []
+    with _lock:
+        out.append("# HELP spa_duration_seconds Wall time per Dash callback / Streamlit rerun phase.")
+        out.append("# TYPE spa_duration_seconds histogram")
+        for (name, outcome), h in sorted(_timings.items()):
+            for le, n in zip(BUCKETS, h["buckets"]):
+                out.append(f"spa_duration_seconds_bucket{_labels(name=name, outcome=outcome, le=le)} {n}")
+            out.append(f"spa_duration_seconds_bucket{_labels(name=name, outcome=outcome, le='+Inf')} {h['count']}")
+            out.append(f"spa_duration_seconds_sum{_labels(name=name, outcome=outcome)} {h['sum']:.6f}")
+            out.append(f"spa_duration_seconds_count{_labels(name=name, outcome=outcome)} {h['count']}")
+        out.append("# HELP spa_payload_bytes Serialized size of the state store / figure sent to the browser.")
+        out.append("# TYPE spa_payload_bytes summary")
+        for (name, kind), s in sorted(_sizes.items()):
+            out.append(f"spa_payload_bytes_sum{_labels(name=name, kind=kind)} {s['sum']}")
+            out.append(f"spa_payload_bytes_count{_labels(name=name, kind=kind)} {s['count']}")
+        out.append("# HELP spa_payload_bytes_last Size of the most recent payload.")
+        out.append("# TYPE spa_payload_bytes_last gauge")
+        for (name, kind), s in sorted(_sizes.items()):
+            out.append(f"spa_payload_bytes_last{_labels(name=name, kind=kind)} {s['last']}")
+        out.append("# HELP spa_gauge Last observed value (e.g. tasks on the schedule).")
+        out.append("# TYPE spa_gauge gauge")
+        for (name, kind), v in sorted(_gauges.items()):
+            out.append(f"spa_gauge{_labels(name=name, kind=kind)} {v}")
+    return "\n".join(out) + "\n"
+
+def snapshot():
+    """(timing rows, last payload sizes, gauges); a timing row per name/outcome has count, mean and the
+    p50 / p95 / max of the recent window in ms."""
+    rows = []
+    with _lock:
+        for (name, outcome), h in sorted(_timings.items()):
+            recent = sorted(h["recent"])
+            pick = lambda q: recent[min(len(recent) - 1, int(q * len(recent)))] * 1000
+            rows.append({"name": name, "outcome": outcome, "count": h["count"],
+                         "mean_ms": round(h["sum"] / h["count"] * 1000, 2),
+                         "p50_ms": round(pick(0.5), 2), "p95_ms": round(pick(0.95), 2),
+                         "max_ms": round(recent[-1] * 1000, 2)})
+        sizes = {f"{name} ({kind})": s["last"] for (name, kind), s in sorted(_sizes.items())}
+        gauges = {f"{name} ({kind})": v for (name, kind), v in sorted(_gauges.items())}
+    return rows, sizes, gauges
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _sizes.clear()
+        _gauges.clear()
@@ -0,0 +1,223 @@
+# Compact plan representation: interned ids and one typed-array record per (day, worker) row.
+# A task {"id": "t17", "customer": "Ali", "service_id": "svc_thai"[, "gap_min": 15]} becomes one slot in
+# each of its row's parallel arrays: the number of its id, a service code, a customer code and the gap.
+# Worker ids, service ids and customer names are stored once, in the Interner tables of a PlanTables.
+# Every array uses the narrowest typecode its values fit, so a busy month of a large team costs a few
+# bytes per booking instead of a dict and its strings. A column that does not fit the shape (other task
+# fields, ids not of the form t<n>) is kept as it is. Conversions are lossless: unpacking gives back
+# equal columns, rev stamps included.
+#   - pack_state()/unpack_state(): a Dash state to and from a JSON-ready form (arrays as base64 text)
+#   - PackedDay: a Streamlit day parked in memory; iterating it yields the day's columns
+
+import base64
+import operator
+import re
+import sys
+from array import array
+from itertools import repeat
+
+# space-separated task ids, each t<n> without leading zeros so "t" + str(n) gives the id back
+TASK_IDS = re.compile(r"t(?:0|[1-9]\d{0,17})(?: t(?:0|[1-9]\d{0,17}))*")
+COLUMN_FIELDS = {"worker_id", "tasks", "rev"}
+TASK_FIELDS = {"id", "customer", "service_id"}
+GAP_FIELD = "gap_min"
+FORMAT = 1
+_id, _customer, _service = (operator.itemgetter(k) for k in ("id", "customer", "service_id"))
+
+def _narrow(values, signed=False) -> array:
+    """values in the smallest array typecode that holds them all."""
+    lo, hi = (min(values), max(values)) if values else (0, 0)
+    for code in ("bhiq" if signed or lo < 0 else "BHIQ"):
+        a = array(code)
+        bits = a.itemsize * 8
+        if (-(1 << (bits - 1)) <= lo and hi < (1 << (bits - 1))) if code.islower() else hi < (1 << bits):
+            a.extend(values)
+            return a
+    raise OverflowError(f"value out of range: {lo}..{hi}")
+
+def _encode(a: array) -> str:
+    """typecode + base64 of the little-endian buffer, e.g. "HAQACAA=="."""
+    if sys.byteorder == "big":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.typecode + base64.b64encode(a.tobytes()).decode("ascii")
+
+def _decode(text: str) -> array:
+    a = array(text[0], base64.b64decode(text[1:]))
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+class Interner:
+    """value <-> small int code, in first-seen order."""
+
+    __slots__ = ("values", "_codes")
+
+    def __init__(self, values=()):
+        self.values = []
+        self._codes = {}
+        for v in values:
+            self.code(v)
+
+    def code(self, value) -> int:
+        c = self._codes.get(value)
+        if c is None:
+            c = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return c
+
+    def codes(self, values) -> list:
+        for v in dict.fromkeys(values).keys() - self._codes.keys():
+            self.code(v)
+        return list(map(self._codes.__getitem__, values))
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+class PackedRow:
+    """One worker column: worker code, rev and parallel arrays, or the column itself when it does not fit."""
+
+    __slots__ = ("worker", "rev", "ids", "services", "customers", "gaps", "raw")
+
+    def __init__(self, worker=None, rev=None, ids=None, services=None, customers=None, gaps=None, raw=None):
+        self.worker, self.rev, self.raw = worker, rev, raw
+        self.ids, self.services, self.customers, self.gaps = ids, services, customers, gaps
+
+    def __len__(self):
+        return len(self.raw["tasks"]) if self.raw is not None else len(self.ids)
+
+class PlanTables:
+    """The interned worker ids, service ids and customers that packed rows refer to."""
+
+    def __init__(self, workers=(), services=(), customers=()):
+        self.workers = Interner(workers)
+        self.services = Interner(services)
+        self.customers = Interner(customers)
+
+    def pack_column(self, col: dict) -> PackedRow:
+        # whole-column checks and conversions (map/join/regex) rather than a Python loop per task
+        tasks = col.get("tasks") or []
+        if col.keys() - COLUMN_FIELDS or type(col.get("worker_id")) is not str:
+            return PackedRow(raw=col)
+        gaps = bool(tasks) and GAP_FIELD in tasks[0]
+        fields = TASK_FIELDS | {GAP_FIELD} if gaps else TASK_FIELDS
+        if not all(map(operator.eq, map(dict.keys, tasks), repeat(fields))):
+            return PackedRow(raw=col)
+        ids, customers, services = list(map(_id, tasks)), list(map(_customer, tasks)), list(map(_service, tasks))
+        gap_values = [t[GAP_FIELD] for t in tasks] if gaps else []
+        if (not set(map(type, ids + customers + services)) <= {str} or not set(map(type, gap_values)) <= {int}
+                or (tasks and not TASK_IDS.fullmatch(" ".join(ids)))):
+            return PackedRow(raw=col)
+        return PackedRow(
+            worker=self.workers.code(col["worker_id"]),
+            rev=col.get("rev"),
+            ids=_narrow(list(map(int, "".join(ids).split("t")[1:]))),
+            services=_narrow(self.services.codes(services)),
+            customers=_narrow(self.customers.codes(customers)),
+            gaps=_narrow(gap_values, signed=True) if gaps else None,
+        )
+
+    def unpack_column(self, row: PackedRow) -> dict:
+        if row.raw is not None:
+            return row.raw
+        svc, cust = self.services.values, self.customers.values
+        if row.gaps is None:
+            tasks = [{"id": f"t{i}", "customer": cust[c], "service_id": svc[s]}
+                     for i, s, c in zip(row.ids, row.services, row.customers)]
+        else:
+            tasks = [{"id": f"t{i}", "customer": cust[c], "service_id": svc[s], GAP_FIELD: g}
+                     for i, s, c, g in zip(row.ids, row.services, row.customers, row.gaps)]
+        col = {"worker_id": self.workers[row.worker], "tasks": tasks}
+        if row.rev is not None:
+            col["rev"] = row.rev
+        return col
+
+    # ---- JSON form ----
+    def row_json(self, row: PackedRow):
+        if row.raw is not None:
+            return row.raw  # a plain column object; packed rows are lists
+        return [row.worker, row.rev, _encode(row.ids), _encode(row.services), _encode(row.customers),
+                None if row.gaps is None else _encode(row.gaps)]
+
+    @staticmethod
+    def row_from_json(entry) -> PackedRow:
+        if isinstance(entry, dict):
+            return PackedRow(raw=entry)
+        worker, rev, ids, services, customers, gaps = entry
+        return PackedRow(worker, rev, _decode(ids), _decode(services), _decode(customers),
+                         None if gaps is None else _decode(gaps))
+
+    def to_json(self) -> dict:
+        return {"v": FORMAT, "workers": self.workers.values, "services": self.services.values,
+                "customers": self.customers.values}
+
+    @classmethod
+    def from_json(cls, d: dict) -> "PlanTables":
+        if d.get("v") != FORMAT:
+            raise ValueError(f"unsupported packed plan format {d.get('v')!r}")
+        return cls(d["workers"], d["services"], d["customers"])
+
+def pack_state(state: dict) -> dict:
+    """state with its "workers" columns replaced by one JSON-ready "packed" entry; other keys are kept."""
+    tables = PlanTables()
+    rows = [tables.row_json(tables.pack_column(c)) for c in state["workers"]]
+    out = {k: v for k, v in state.items() if k != "workers"}
+    out["packed"] = {**tables.to_json(), "rows": rows}
+    return out
+
+def unpack_state(value: dict) -> dict:
+    """Inverse of pack_state(); a value already in the plain shape is returned as it is."""
+    packed = value.get("packed")
+    if packed is None:
+        return value
+    tables = PlanTables.from_json(packed)
+    out = {k: v for k, v in value.items() if k != "packed"}
+    out["workers"] = [tables.unpack_column(tables.row_from_json(r)) for r in packed["rows"]]
+    return out
+
+class PackedDay:
+    """A day's worker columns held packed against shared tables.
+
+    Iterating yields the columns unpacked (fresh dicts equal to the originals), so code that only reads a
+    day, such as TaskIndex, can take it as it is; columns() is the list to edit. revs(), n_tasks() and
+    nbytes() read the packed rows without unpacking them.
+    """
+
+    __slots__ = ("tables", "rows")
+
+    def __init__(self, columns, tables: PlanTables):
+        self.tables = tables
+        self.rows = [tables.pack_column(c) for c in columns]
+
+    def __iter__(self):
+        return (self.tables.unpack_column(r) for r in self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def columns(self) -> list:
+        return list(self)
+
+    def n_tasks(self) -> int:
+        return sum(len(r) for r in self.rows)
+
+    def column(self, i: int) -> dict:
+        return self.tables.unpack_column(self.rows[i])
+
+    def revs(self) -> dict:
+        """worker_id -> rev stamp of each column, in column order."""
+        out = {}
+        for r in self.rows:
+            if r.raw is not None:
+                out[r.raw["worker_id"]] = r.raw.get("rev")
+            else:
+                out[self.tables.workers[r.worker]] = r.rev
+        return out
+
+    def nbytes(self) -> int:
+        """Approximate packed size: the rows' array buffers (columns kept as they are are not counted)."""
+        return sum(a.itemsize * len(a) for r in self.rows if r.raw is None
+                   for a in (r.ids, r.services, r.customers, r.gaps) if a is not None)
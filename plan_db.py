@@ -0,0 +1,104 @@
+# Durable plan storage in a local SQLite file (WAL mode, no external database).
+# One row per booking keyed by (day, worker_id, position). Edits are staged per (day, worker)
+# partition and written in one transaction per Streamlit rerun / Dash callback; reads fetch a
+# window of days with a single range query on the primary key. Staging is thread-safe (Dash serves
+# callbacks from several threads). A flush rewrites whole rows, so two sessions editing the same
+# (day, worker) row do not merge: the last one to flush wins.
+
+import json
+import sqlite3
+import threading
+from collections import defaultdict
+from contextlib import closing
+
+BOOKING_FIELDS = ("id", "customer", "service_id")
+
+class PlanDB:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS bookings (
+        day TEXT NOT NULL, worker_id TEXT NOT NULL, position INTEGER NOT NULL,
+        task_id TEXT NOT NULL, customer TEXT NOT NULL, service_id TEXT NOT NULL,
+        extra TEXT,  -- JSON of any other task fields
+        PRIMARY KEY (day, worker_id, position));
+    CREATE UNIQUE INDEX IF NOT EXISTS bookings_task_id ON bookings (task_id);
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._pending = {}  # (day, worker_id) -> tasks
+        self._lock = threading.Lock()
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(self.SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def load_days(self, first_day: str, last_day: str) -> dict:
+        """{day: {worker_id: [task, ...]}} for ISO days in [first_day, last_day], staged edits applied."""
+        plan = defaultdict(lambda: defaultdict(list))
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT day, worker_id, task_id, customer, service_id, extra FROM bookings"
+                " WHERE day BETWEEN ? AND ? ORDER BY day, worker_id, position",
+                (first_day, last_day),
+            )
+            for day, worker_id, task_id, customer, service_id, extra in rows:
+                task = {"id": task_id, "customer": customer, "service_id": service_id}
+                if extra:
+                    task.update(json.loads(extra))
+                plan[day][worker_id].append(task)
+        with self._lock:
+            pending = list(self._pending.items())
+        for (day, worker_id), tasks in pending:
+            if first_day <= day <= last_day:
+                plan[day][worker_id] = list(tasks)
+        return {day: dict(cols) for day, cols in plan.items()}
+
+    def stage(self, day: str, worker_id: str, tasks: list):
+        """Queue a rewrite of one (day, worker) row; the latest staged version wins."""
+        with self._lock:
+            self._pending[(day, worker_id)] = tasks
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+        rows = [
+            (day, worker_id, pos, t["id"], t["customer"], t["service_id"],
+             json.dumps({k: v for k, v in t.items() if k not in BOOKING_FIELDS}) if len(t) > len(BOOKING_FIELDS) else None)
+            for (day, worker_id), tasks in pending.items()
+            for pos, t in enumerate(tasks)
+        ]
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany("DELETE FROM bookings WHERE day = ? AND worker_id = ?", list(pending))
+                # a task moved between rows may still sit in a row not rewritten in this batch
+                db.executemany("DELETE FROM bookings WHERE task_id = ?", [(r[3],) for r in rows])
+                db.executemany("INSERT INTO bookings VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                with self._lock:
+                    self._pending = {**pending, **self._pending}
+                raise
+
+    def clear(self):
+        """Delete every stored booking (and drop staged edits); task sequence numbers keep counting."""
+        with self._lock:
+            self._pending = {}
+        with closing(self._connect()) as db:
+            db.execute("DELETE FROM bookings")
+
+    def next_seq(self) -> int:
+        """Allocate a task sequence number shared by every session using this file."""
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("INSERT OR IGNORE INTO meta VALUES ('seq', 0)")
+            db.execute("UPDATE meta SET value = value + 1 WHERE key = 'seq'")
+            (seq,) = db.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()
+            db.execute("COMMIT")
+        return seq
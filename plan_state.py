@@ -0,0 +1,116 @@
+# Copy-on-write edits for a day's worker columns: [{"worker_id": ..., "tasks": [...]}, ...]
+# Every helper returns a new column list; only the touched worker's column (and its task list) is
+# copied, all other columns are shared with the input. Inputs are never mutated, so any earlier
+# list doubles as a cheap snapshot for undo/redo. A rewritten column also gets a fresh "rev" stamp,
+# which caches of derived rows (utils.RowParts) key on even after a JSON round trip.
+
+import secrets
+from collections import deque
+
+def new_rev() -> str:
+    return secrets.token_hex(8)
+
+def column(worker_id, tasks):
+    """A new stamped worker column."""
+    return {"worker_id": worker_id, "tasks": tasks, "rev": new_rev()}
+
+def _replace(columns, worker_id, tasks):
+    return [dict(c, tasks=tasks, rev=new_rev()) if c["worker_id"] == worker_id else c for c in columns]
+
+def tasks_of(columns, worker_id):
+    return next(c["tasks"] for c in columns if c["worker_id"] == worker_id)
+
+def locate_task(columns, task_id, prefer_worker_id=None):
+    """Return (worker_id, position) of a task, checking prefer_worker_id's column first, or (None, None)."""
+    ordered = sorted(columns, key=lambda c: c["worker_id"] != prefer_worker_id) if prefer_worker_id else columns
+    for col in ordered:
+        for i, t in enumerate(col["tasks"]):
+            if t["id"] == task_id:
+                return col["worker_id"], i
+    return None, None
+
+def append_task(columns, worker_id, task):
+    return _replace(columns, worker_id, tasks_of(columns, worker_id) + [task])
+
+def extend_tasks(columns, additions):
+    """Append {worker_id: [task, ...]} with one copy per touched column."""
+    return [dict(c, tasks=c["tasks"] + additions[c["worker_id"]], rev=new_rev()) if additions.get(c["worker_id"])
+            else c for c in columns]
+
+def insert_task(columns, worker_id, pos, task):
+    tasks = tasks_of(columns, worker_id)
+    return _replace(columns, worker_id, tasks[:pos] + [task] + tasks[pos:])
+
+def remove_task(columns, worker_id, pos):
+    """Return (new columns, removed task)."""
+    tasks = tasks_of(columns, worker_id)
+    return _replace(columns, worker_id, tasks[:pos] + tasks[pos + 1:]), tasks[pos]
+
+def update_task(columns, worker_id, pos, **fields):
+    tasks = list(tasks_of(columns, worker_id))
+    tasks[pos] = {**tasks[pos], **fields}
+    return _replace(columns, worker_id, tasks)
+
+class History:
+    """Bounded undo/redo stacks of plan snapshots (plain references, thanks to structural sharing)."""
+
+    def __init__(self, limit=50):
+        self._undo = deque(maxlen=limit)
+        self._redo = []
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def record(self, snapshot):
+        """Call with the state about to be replaced by a new edit."""
+        self._undo.append(snapshot)
+        self._redo.clear()
+
+    def undo(self, current):
+        self._redo.append(current)
+        return self._undo.pop()
+
+    def redo(self, current):
+        self._undo.append(current)
+        return self._redo.pop()
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+
+    def __iter__(self):
+        """Every snapshot held, undo side then redo side."""
+        return iter([*self._undo, *self._redo])
+
+class TaskIndex:
+    """task_id -> (day, worker_id, position) over a {day: columns} plan, repaired after each edit."""
+
+    def __init__(self, plan_by_day=None):
+        self._where = {}
+        for day, cols in (plan_by_day or {}).items():
+            self.add_day(day, cols)
+
+    def add_day(self, day, cols):
+        for col in cols:
+            self._place(day, col["worker_id"], col["tasks"], 0)
+
+    def _place(self, day, worker_id, tasks, start):
+        for pos in range(start, len(tasks)):
+            self._where[tasks[pos]["id"]] = (day, worker_id, pos)
+
+    def get(self, task_id):
+        return self._where.get(task_id)
+
+    def inserted(self, day, worker_id, tasks, pos):
+        """`tasks` is the worker's list after inserting at pos; later positions shift up."""
+        self._place(day, worker_id, tasks, pos)
+
+    def removed(self, day, worker_id, tasks, pos, task_id):
+        """`tasks` is the worker's list after popping task_id from pos; later positions shift down."""
+        self._where.pop(task_id, None)
+        self._place(day, worker_id, tasks, pos)
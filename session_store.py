@@ -0,0 +1,147 @@
+# Server-side home for the Dash `state` store.
+# The browser keeps only {"sid", "version"}; the plan lives here under a version number.
+#   - MemorySessionStore: one process (python app.py, gunicorn -w 1)
+#   - SQLiteSessionStore: a file shared by all gunicorn workers on the host; every edit is written as a
+#     small delta (the top-level values and worker columns it replaced) on top of a periodic snapshot
+# Snapshots and deltas are JSON text, encoded with orjson when it is installed; snapshots hold the plan
+# packed (plan_codec).
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import closing
+
+from plan_codec import pack_state, unpack_state
+
+try:
+    import orjson
+except Exception:  # stdlib json fallback below
+    orjson = None
+
+def dumps(obj) -> str:
+    return orjson.dumps(obj).decode() if orjson is not None else json.dumps(obj)
+
+def loads(text):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+def diff_state(old: dict, new: dict) -> dict:
+    """Delta from old to new. Worker columns are compared by identity (plan_state shares untouched ones)."""
+    delta = {k: v for k, v in new.items() if k != "workers" and old.get(k) != v}
+    old_cols = {c["worker_id"]: c for c in old.get("workers", [])}
+    delta["workers"] = {c["worker_id"]: c for c in new.get("workers", []) if old_cols.get(c["worker_id"]) is not c}
+    return delta
+
+def apply_delta(state: dict, delta: dict) -> dict:
+    cols = delta.get("workers", {})
+    workers = [cols.get(c["worker_id"], c) for c in state["workers"]]
+    return {**state, **{k: v for k, v in delta.items() if k != "workers"}, "workers": workers}
+
+class MemorySessionStore:
+    def __init__(self, max_sessions=1000):
+        self._sessions = OrderedDict()  # sid -> {"version", "state"}
+        self._max_sessions = max_sessions
+        self._lock = threading.Lock()
+
+    def create(self, state: dict) -> str:
+        sid = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[sid] = {"version": 0, "state": state}
+            while len(self._sessions) > self._max_sessions:
+                self._sessions.popitem(last=False)
+        return sid
+
+    def load(self, sid: str):
+        """Return (version, state); KeyError if the session is unknown or was evicted."""
+        with self._lock:
+            sess = self._sessions[sid]
+            self._sessions.move_to_end(sid)
+            return sess["version"], sess["state"]
+
+    def update(self, sid: str, edit):
+        """Apply edit(state) -> new state atomically; return (version, new state). Exceptions abort the edit."""
+        with self._lock:
+            sess = self._sessions[sid]
+            new_state = edit(sess["state"])
+            sess["version"] += 1
+            sess["state"] = new_state
+            return sess["version"], new_state
+
+class SQLiteSessionStore:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        sid TEXT PRIMARY KEY, version INTEGER NOT NULL,
+        snapshot TEXT NOT NULL, snapshot_version INTEGER NOT NULL, updated_at REAL NOT NULL);
+    CREATE TABLE IF NOT EXISTS deltas (
+        sid TEXT NOT NULL, version INTEGER NOT NULL, delta TEXT NOT NULL,
+        PRIMARY KEY (sid, version));
+    """
+
+    def __init__(self, path, snapshot_every=50, max_age_s=7 * 24 * 3600):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.max_age_s = max_age_s
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(self.SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def _load(self, db, sid):
+        row = db.execute("SELECT version, snapshot, snapshot_version FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        if row is None:
+            raise KeyError(sid)
+        version, snapshot, snapshot_version = row
+        state = unpack_state(loads(snapshot))  # snapshots written before packing load as they are
+        for (delta,) in db.execute("SELECT delta FROM deltas WHERE sid = ? AND version > ? ORDER BY version",
+                                   (sid, snapshot_version)):
+            state = apply_delta(state, loads(delta))
+        return version, state
+
+    def create(self, state: dict) -> str:
+        sid = uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("INSERT INTO sessions VALUES (?, 0, ?, 0, ?)", (sid, dumps(pack_state(state)), now))
+            stale = [r[0] for r in db.execute("SELECT sid FROM sessions WHERE updated_at < ?", (now - self.max_age_s,))]
+            db.executemany("DELETE FROM deltas WHERE sid = ?", [(s,) for s in stale])
+            db.executemany("DELETE FROM sessions WHERE sid = ?", [(s,) for s in stale])
+            db.execute("COMMIT")
+        return sid
+
+    def load(self, sid: str):
+        with closing(self._connect()) as db:
+            return self._load(db, sid)
+
+    def update(self, sid: str, edit):
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")  # serialises edits across worker processes
+            try:
+                version, state = self._load(db, sid)
+                new_state = edit(state)
+                version += 1
+                db.execute("INSERT INTO deltas VALUES (?, ?, ?)", (sid, version, dumps(diff_state(state, new_state))))
+                if version % self.snapshot_every == 0:
+                    db.execute("UPDATE sessions SET snapshot = ?, snapshot_version = ? WHERE sid = ?",
+                               (dumps(pack_state(new_state)), version, sid))
+                    db.execute("DELETE FROM deltas WHERE sid = ? AND version <= ?", (sid, version - self.snapshot_every))
+                db.execute("UPDATE sessions SET version = ?, updated_at = ? WHERE sid = ?", (version, time.time(), sid))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return version, new_state
+
+def open_store(url):
+    """'memory' -> MemorySessionStore, 'sqlite:///path/to.db' -> SQLiteSessionStore, empty -> None."""
+    if not url:
+        return None
+    if url == "memory":
+        return MemorySessionStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported SESSION_STORE {url!r}; use 'memory' or 'sqlite:///path/to.db'.")
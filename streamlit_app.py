@@ -5,31 +5,35 @@
 # - Reset moved under 3-dots popover
 # - Click a bar to edit/delete
 
-import io
-import re
+import os
 import random
+import time
 from datetime import datetime, timedelta, date
-import requests
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import streamlit as st
-from pydub import AudioSegment                      # pydub==0.25.1, ffmpeg-python==0.2.0
 from streamlit_plotly_events import plotly_events   # streamlit-plotly-events==0.0.6
 
-# ---------- optional fuzzy: try rapidfuzz, else difflib fallback ----------
-try:
-    from rapidfuzz import process, fuzz
-    def best_extract_one(query, choices, cutoff=80):
-        res = process.extractOne(query, choices, scorer=fuzz.WRatio, score_cutoff=cutoff)
-        return (res[0], res[1]) if res else (None, 0)
-except Exception:
-    from difflib import get_close_matches
-    def best_extract_one(query, choices, cutoff=80):
-        match = get_close_matches(query, choices, n=1, cutoff=cutoff/100.0)
-        return (match[0], 100) if match else (None, 0)
+from utils import LRUCache, RowParts, concat_parts, epoch_minutes, row_part
+from gantt import timeline_figure
+from plan_state import History, TaskIndex, append_task, column, extend_tasks, remove_task, tasks_of, update_task
+from plan_codec import PackedDay, PlanTables
+from plan_db import PlanDB
+from availability import AvailabilityIndex
+from assign import AUTO, assign
+from spa_data import DAY_START, DAY_END
+from audio_prep import preprocess_audio
+from stt_client import STTClient
+from transcript_cache import TranscriptCache, transcript_key
+from command_parser import CommandParser
+from fuzzy_index import FuzzyIndex, normalize
+import metrics
+from metrics import timed
 
 # -------------------- App config --------------------
 st.set_page_config(page_title="Spa Scheduler (2D • Mic • Edit)", layout="wide")
+rerun_t0 = time.perf_counter()  # METRICS=1: whole-rerun wall time, observed at the bottom of the script
 
 # -------------------- Demo data ---------------------
 WORKERS = [
@@ -49,10 +53,20 @@ SERVICES = [
 ]
 services_idx = {s["id"]: s for s in SERVICES}
 workers_idx  = {w["id"]: w for w in WORKERS}
+GAP_CHOICES = [15, 20, 30]  # idle minutes after a booking, drawn once and stored with the task
 
 # -------------------- App state ---------------------
+# PLAN_DB=/path/plan.db keeps bookings in SQLite across restarts; days are loaded as the window shows them
+if "plan_db" not in st.session_state:
+    st.session_state.plan_db = PlanDB(os.environ["PLAN_DB"]) if os.environ.get("PLAN_DB") else None
+plan_db = st.session_state.plan_db
+if plan_db:
+    plan_db.flush()  # edits staged by a run that ended in st.rerun()
+
 if "seq" not in st.session_state:
     st.session_state.seq = 0
+if "plan_by_day" not in st.session_state and plan_db:
+    st.session_state.plan_by_day = {}
 if "plan_by_day" not in st.session_state:
     def seed_day(d: date):
         customers = ["Ali", "Maya", "Rafi", "Lina", "John", "Emma", "Tom", "Sara"]
@@ -67,8 +81,9 @@ if "plan_by_day" not in st.session_state:
                     "id": f"t{st.session_state.seq}",
                     "customer": random.choice(customers),
                     "service_id": random.choice(svc_ids),
+                    "gap_min": random.choice(GAP_CHOICES),
                 })
-            seeded.append({"worker_id": w["id"], "tasks": tasks})
+            seeded.append(column(w["id"], tasks))
         return seeded
 
     today = date.today()
@@ -77,195 +92,461 @@ if "plan_by_day" not in st.session_state:
         for i in range(3)
     }
 
+# days outside the current view are parked packed (PackedDay) against these interned tables
+if "plan_tables" not in st.session_state:
+    st.session_state.plan_tables = PlanTables([w["id"] for w in WORKERS], [s["id"] for s in SERVICES])
+# undo/redo over plan snapshots (days share structure, so a snapshot is just a reference)
+if "history" not in st.session_state:
+    st.session_state.history = History()
+# task_id -> (day, worker_id, position) for click-to-edit lookups
+if "task_index" not in st.session_state:
+    st.session_state.task_index = TaskIndex(st.session_state.plan_by_day)
+
+# returning customers for snapping spoken names to their existing spelling; grows as days load / bookings land
+def remember_customers(tasks):
+    index = st.session_state.customer_index
+    for t in tasks:
+        key = normalize(t["customer"])
+        if key and key not in index:
+            index.add(key, t["customer"])
+
+if "customer_index" not in st.session_state:
+    st.session_state.customer_index = FuzzyIndex()
+    for cols in st.session_state.plan_by_day.values():
+        for col in cols:
+            remember_customers(col["tasks"])
+
+# layout is a pure function of the plan: bump plan_version on every change and memoize views on it
+if "plan_version" not in st.session_state:
+    st.session_state.plan_version = 0
+if "view_cache" not in st.session_state:
+    st.session_state.view_cache = LRUCache(maxsize=8)  # (plan_version, start_day, span_days, ...) -> (df, fig)
+# day -> (columns, bars, blocks); a day is reassembled only when its columns list is swapped out, and
+# then only the (day, worker) rows whose column changed are laid out again
+if "day_frames" not in st.session_state:
+    st.session_state.day_frames = LRUCache(maxsize=64)
+if "row_parts" not in st.session_state:
+    st.session_state.row_parts = RowParts(maxsize=8192)
+# day drilled into from the aggregated (week/month) view
+st.session_state.setdefault("focus_day", None)
+
+# slot-grid busy bitsets per (day, worker), refreshed lazily from the rows that changed
+if "availability" not in st.session_state:
+    st.session_state.availability = AvailabilityIndex(services_idx, gap_field="gap_min")
+
 # temp voice state
-for k in ("mic_audio_bytes", "mic_audio_mime", "mic_transcript", "mic_cmd"):
+for k in ("mic_audio_bytes", "mic_audio_mime", "mic_transcript", "mic_cmds", "mic_unparsed", "mic_prep_stats", "mic_job", "mic_error", "mic_cache_key"):
     st.session_state.setdefault(k, None)
 # selected task for edit
 if "selected_task" not in st.session_state:
     st.session_state.selected_task = None  # {"day","task_id","worker_id"}
 
 # -------------------- Helpers -----------------------
+def load_window(start_day: date, days: int):
+    """Make sure every day of the window is in memory as columns: parked days are unpacked, missing ones
+    fetched with one PLAN_DB range query."""
+    plan = st.session_state.plan_by_day
+    window = window_days(start_day, days)
+    for d in window:
+        if isinstance(plan.get(d), PackedDay):
+            swap_day(d, plan[d], plan[d].columns())
+    missing = [d for d in window if d not in plan]
+    if not missing:
+        return
+    stored = plan_db.load_days(missing[0], missing[-1]) if plan_db else {}
+    for d in missing:
+        by_worker = stored.get(d, {})
+        plan[d] = [column(w["id"], by_worker.get(w["id"], [])) for w in WORKERS]
+        st.session_state.task_index.add_day(d, plan[d])
+        for col in plan[d]:
+            remember_customers(col["tasks"])
+    st.session_state.plan_version += 1
+
 def ensure_day_exists(day_iso: str):
-    if day_iso not in st.session_state.plan_by_day:
-        st.session_state.plan_by_day[day_iso] = [{"worker_id": w["id"], "tasks": []} for w in WORKERS]
+    if not isinstance(st.session_state.plan_by_day.get(day_iso), list):
+        load_window(date.fromisoformat(day_iso), 1)
+
+def day_cols(day_iso: str) -> list:
+    """The day's worker columns, loaded or unparked first if needed."""
+    cols = st.session_state.plan_by_day.get(day_iso)
+    if not isinstance(cols, list):
+        load_window(date.fromisoformat(day_iso), 1)
+        cols = st.session_state.plan_by_day[day_iso]
+    return cols
+
+def swap_day(day_iso: str, old, new):
+    """Put an equal representation of a day in place of `old`, in the plan and in every undo/redo snapshot
+    that shares it (parking never changes content, so no version bump and nothing to stage)."""
+    for plan in (st.session_state.plan_by_day, *st.session_state.history):
+        if plan.get(day_iso) is old:
+            plan[day_iso] = new
+
+def park_days(keep):
+    """Pack every in-memory day not in `keep`; a view or edit that needs one unpacks it again."""
+    for d, cols in list(st.session_state.plan_by_day.items()):
+        if d not in keep and isinstance(cols, list):
+            swap_day(d, cols, PackedDay(cols, st.session_state.plan_tables))
+            st.session_state.day_frames.pop(d)
+
+def stage_changes(old_plan: dict, new_plan: dict):
+    """Queue the (day, worker) rows that differ between two plans for PLAN_DB.
+
+    Rows are compared by identity; a parked day unpacks to fresh dicts, so there its rev stamps are compared
+    and only the rows that changed are unpacked.
+    """
+    if not plan_db:
+        return
+    for day, cols in new_plan.items():
+        old_cols = old_plan.get(day)
+        if old_cols is cols:
+            continue
+        if isinstance(cols, PackedDay) or isinstance(old_cols, PackedDay):
+            old_revs = row_revs(old_cols or [])
+            for i, (worker_id, rev) in enumerate(row_revs(cols).items()):
+                if rev is None or old_revs.get(worker_id) != rev:
+                    c = cols.column(i) if isinstance(cols, PackedDay) else cols[i]
+                    plan_db.stage(day, worker_id, c["tasks"])
+            continue
+        old_by_worker = {c["worker_id"]: c for c in old_cols or []}
+        for c in cols:
+            if old_by_worker.get(c["worker_id"]) is not c:
+                plan_db.stage(day, c["worker_id"], c["tasks"])
+
+def row_revs(cols) -> dict:
+    """worker_id -> rev stamp of a day's columns, parked or not."""
+    if isinstance(cols, PackedDay):
+        return cols.revs()
+    return {c["worker_id"]: c.get("rev") for c in cols}
+
+def set_day(day_iso: str, cols: list, undoable: bool = True):
+    """Swap in a day's new columns; the previous plan (sharing every other day) becomes the undo step."""
+    old_plan = st.session_state.plan_by_day
+    if undoable:
+        st.session_state.history.record(old_plan)
+    st.session_state.plan_by_day = {**old_plan, day_iso: cols}
+    st.session_state.plan_version += 1
+    stage_changes(old_plan, st.session_state.plan_by_day)
+
+def replace_plan(plan: dict):
+    """Swap the whole plan (undo/redo/reset) and rebuild what derives from it."""
+    stage_changes(st.session_state.plan_by_day, plan)
+    st.session_state.plan_by_day = plan
+    st.session_state.plan_version += 1
+    st.session_state.task_index = TaskIndex(plan)
 
 def push_to_plan(day_iso: str, customer: str, service_id: str, worker_id: str):
+    """Append one booking; worker_id may be AUTO. Returns the worker it went to (None if nothing fits)."""
+    return push_batch(day_iso, [(customer, service_id, worker_id)])[0]
+
+def push_batch(day_iso: str, bookings: list, gaps: list = None) -> list:
+    """Append (customer, service_id, worker_id) bookings with a single plan write.
+
+    Bookings with worker_id AUTO are balanced across workers by the assignment engine, after the
+    explicitly assigned ones. gaps fixes each booking's gap_min (drawn at random otherwise).
+    Returns the worker each booking went to (None if it fits nowhere).
+    """
     ensure_day_exists(day_iso)
-    st.session_state.seq += 1
-    task = {"id": f"t{st.session_state.seq}", "customer": customer, "service_id": service_id}
-    for col in st.session_state.plan_by_day[day_iso]:
-        if col["worker_id"] == worker_id:
-            col["tasks"].append(task)
-            break
-
-def build_schedule_df(start_day: date, days: int = 3) -> pd.DataFrame:
-    """One row per worker across the entire time axis; tasks placed on Start/Finish over actual dates."""
-    rows = []
-    for i in range(days):
-        d = (start_day + timedelta(days=i))
-        d_iso = d.isoformat()
-        ensure_day_exists(d_iso)
-        day_cols = st.session_state.plan_by_day[d_iso]
-
-        start_hour = 9
-        cur_start_by_worker = {
-            c["worker_id"]: datetime.combine(d, datetime.min.time()).replace(hour=start_hour)
-            for c in day_cols
-        }
-        for col in day_cols:
-            worker_id = col["worker_id"]
-            worker_name = workers_idx[worker_id]["name"]
-            cur = cur_start_by_worker[worker_id]
-            for t in col["tasks"]:
-                svc = services_idx[t["service_id"]]
-                dur = timedelta(minutes=svc["duration_min"])
-                rows.append({
-                    "Day": d_iso,
-                    "TaskId": t["id"],
-                    "Customer": t["customer"],
-                    "Service": svc["name"],
-                    "Worker": worker_name,     # y-axis uses single worker name across all days
-                    "WorkerId": worker_id,
-                    "Start": pd.Timestamp(cur),
-                    "Finish": pd.Timestamp(cur + dur),
-                    "Duration(min)": svc["duration_min"],
-                })
-                gap = timedelta(minutes=random.choice([15, 20, 30]))
-                cur = cur + dur + gap
-    return pd.DataFrame(rows)
+    if gaps is None:
+        gaps = [random.choice(GAP_CHOICES) for _ in bookings]
+    tasks = []
+    for (customer, service_id, _), gap in zip(bookings, gaps):
+        st.session_state.seq = plan_db.next_seq() if plan_db else st.session_state.seq + 1
+        tasks.append({"id": f"t{st.session_state.seq}", "customer": customer, "service_id": service_id,
+                      "gap_min": gap})
+    remember_customers(tasks)
+    placed = [None if wid == AUTO else wid for _, _, wid in bookings]
+    additions = {}
+    for i, wid in enumerate(placed):
+        if wid:
+            additions.setdefault(wid, []).append(tasks[i])
+
+    auto = [i for i, (_, _, wid) in enumerate(bookings) if wid == AUTO]
+    if auto:
+        avail = day_availability(day_iso)
+        tails = {w["id"]: avail.tail(day_iso, w["id"]) for w in WORKERS}
+        for wid, added in additions.items():
+            tails[wid] += sum(services_idx[t["service_id"]]["duration_min"] + t["gap_min"] for t in added)
+        jobs = [(services_idx[tasks[i]["service_id"]]["duration_min"], tasks[i]["gap_min"]) for i in auto]
+        rows, _ = assign(jobs, tails, avail.span_min)
+        for wid, row in rows.items():
+            for j in row:
+                placed[auto[j]] = wid
+                additions.setdefault(wid, []).append(tasks[auto[j]])
+
+    if not additions:
+        return placed
+    old_cols = day_cols(day_iso)
+    cols = extend_tasks(old_cols, additions)
+    set_day(day_iso, cols)
+    for wid in additions:
+        st.session_state.task_index.inserted(day_iso, wid, tasks_of(cols, wid), len(tasks_of(old_cols, wid)))
+    return placed
+
+def rebalance_day(day_iso: str):
+    """Re-assign all of a day's bookings to minimise the makespan; returns how many could not be placed."""
+    avail = day_availability(day_iso)
+    tasks = [t for c in day_cols(day_iso) for t in c["tasks"]]
+    jobs = [(services_idx[t["service_id"]]["duration_min"], t.get("gap_min", 0)) for t in tasks]
+    rows, unplaced = assign(jobs, {w["id"]: 0 for w in WORKERS}, avail.span_min)
+    if unplaced:
+        return len(unplaced)
+    cols = [column(wid, [tasks[j] for j in row]) for wid, row in rows.items()]
+    set_day(day_iso, cols)
+    st.session_state.task_index.add_day(day_iso, cols)
+    return 0
+
+def day_availability(day_iso: str) -> AvailabilityIndex:
+    avail = st.session_state.availability
+    avail.sync(day_iso, day_cols(day_iso))
+    return avail
+
+def worker_label(worker_id: str) -> str:
+    return "Auto (balance load)" if worker_id == AUTO else workers_idx[worker_id]["name"]
+
+def check_slot(day_iso: str, service_id: str, worker_id: str):
+    """Return ("HH:MM", None) where an appended booking lands, or (None, reason) if it runs past closing."""
+    avail = day_availability(day_iso)
+    dur = services_idx[service_id]["duration_min"]
+    if worker_id == AUTO:
+        rows, _ = assign([(dur, 0)], {w["id"]: avail.tail(day_iso, w["id"]) for w in WORKERS}, avail.span_min)
+        worker_id = next((wid for wid, row in rows.items() if row), None)
+        if worker_id is None:
+            return None, f"No therapist has a {dur}m slot left before {DAY_END.strftime('%H:%M')} on {day_iso}."
+        return f"{avail.clock(avail.tail(day_iso, worker_id))} with {workers_idx[worker_id]['name']}", None
+    start = avail.tail(day_iso, worker_id)
+    if avail.is_free(day_iso, worker_id, start, dur):
+        return avail.clock(start), None
+    reason = f"{workers_idx[worker_id]['name']} has no {dur}m slot left before {DAY_END.strftime('%H:%M')} on {day_iso}."
+    alt = avail.earliest_free_any(day_iso, [w["id"] for w in WORKERS], dur, append_only=True)
+    if alt:
+        reason += f" Earliest free: {workers_idx[alt[0]]['name']} from {avail.clock(alt[1])}."
+    return None, reason
+
+def check_batch(day_iso: str, bookings: list, gaps: list):
+    """None if every (customer, service_id, worker_id) booking fits when appended together, else the reason."""
+    avail = day_availability(day_iso)
+    tails = {w["id"]: avail.tail(day_iso, w["id"]) for w in WORKERS}
+    auto = []
+    for (customer, service_id, worker_id), gap in zip(bookings, gaps):
+        dur = services_idx[service_id]["duration_min"]
+        if worker_id == AUTO:
+            auto.append((dur, gap))
+            continue
+        if not avail.is_free(day_iso, worker_id, tails[worker_id], dur):
+            return (f"{workers_idx[worker_id]['name']} has no {dur}m slot left for {customer} "
+                    f"before {DAY_END.strftime('%H:%M')} on {day_iso}.")
+        tails[worker_id] += dur + gap
+    if auto:
+        _, unplaced = assign(auto, tails, avail.span_min)
+        if unplaced:
+            return f"No therapist has room for {len(unplaced)} of the unassigned bookings on {day_iso}."
+    return None
+
+SPANS = {3: "3 days", 4: "4 days", 7: "Week", 14: "2 weeks", 30: "Month"}
+DETAIL_MAX_DAYS = 4  # wider windows show one block per worker per day, plus the focus day in full
+BLOCKS = "Booked"  # pseudo-service of the aggregated blocks
+FRAME_COLUMNS = ["Day", "TaskId", "Customer", "Service", "Worker", "WorkerId", "Start", "Finish", "Duration(min)"]
+
+def window_days(start_day: date, days: int) -> list:
+    return [(start_day + timedelta(days=i)).isoformat() for i in range(days)]
+
+def row_block(bars: dict):
+    """One bar spanning the row's first start to last finish; TaskId is blank so a click drills in."""
+    n = len(bars["TaskId"])
+    if not n:
+        return bars
+    start, finish = bars["Start"][:1], bars["Finish"].max(keepdims=True)
+    return {
+        "Day": bars["Day"][:1], "TaskId": np.array([""], dtype=object),
+        "Customer": np.array([f"{n} bookings • {int(bars['Duration(min)'].sum())} min"], dtype=object),
+        "Service": np.array([BLOCKS], dtype=object), "Worker": bars["Worker"][:1], "WorkerId": bars["WorkerId"][:1],
+        "Start": start, "Finish": finish,
+        "Duration(min)": ((finish - start) // np.timedelta64(1, "m")).astype("int64"),
+    }
+
+def worker_row(day_iso: str, col: dict):
+    """(bars, block) column arrays of one worker's day."""
+    base = epoch_minutes(datetime.combine(date.fromisoformat(day_iso), DAY_START))
+    bars = row_part(
+        base, col["tasks"], services_idx,
+        # y-axis uses single worker name across all days
+        {"Day": day_iso, "Worker": workers_idx[col["worker_id"]]["name"], "WorkerId": col["worker_id"]},
+        FRAME_COLUMNS, gap_field="gap_min",
+    )
+    return bars, row_block(bars)
+
+def day_frame(day_iso: str):
+    """(bars, blocks) of one day, reassembled only when that day's columns changed."""
+    cols = day_cols(day_iso)
+    cached = st.session_state.day_frames.get(day_iso)
+    if cached is not None and cached[0] is cols:
+        return cached[1], cached[2]
+    rows = [st.session_state.row_parts.get(day_iso, col, lambda col: worker_row(day_iso, col)) for col in cols]
+    bars = concat_parts([r[0] for r in rows], FRAME_COLUMNS)
+    blocks = concat_parts([r[1] for r in rows], FRAME_COLUMNS)
+    st.session_state.day_frames.put(day_iso, (cols, bars, blocks))
+    return bars, blocks
+
+def build_schedule_df(start_day: date, days: int = 3, focus_day: str = None) -> pd.DataFrame:
+    """One row per worker across the entire time axis; tasks placed on Start/Finish over actual dates.
+
+    Windows wider than DETAIL_MAX_DAYS get per-day blocks instead of bars, except on focus_day.
+    """
+    load_window(start_day, days)
+    detail = days <= DETAIL_MAX_DAYS
+    frames = []
+    for d_iso in window_days(start_day, days):
+        bars, blocks = day_frame(d_iso)
+        frames.append(bars if detail or d_iso == focus_day else blocks)
+    frames = [f for f in frames if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=FRAME_COLUMNS)
+
+GL_AUTO_BARS = 400  # "auto" renderer switches to WebGL above this many bars
+
+def build_timeline_figure(df: pd.DataFrame, renderer: str = "svg", aggregated: bool = False):
+    if renderer == "webgl" or aggregated:
+        # batched traces; same [TaskId, Day, WorkerId] customdata as the px bars
+        services = SERVICES + [{"name": BLOCKS}] if aggregated else SERVICES
+        fig = timeline_figure(
+            df, services, [w["name"] for w in WORKERS], height=900, renderer=renderer,
+            customdata_cols=("TaskId", "Day", "WorkerId"),
+            hovertemplate="%{text}<br>%{y} • %{customdata[1]} • %{customdata[0]}<extra></extra>",
+        )
+        fig.update_layout(xaxis_title=None, yaxis_title=None)
+        return fig
+
+    # Colors by Service; one row per worker; full time axis over multiple days
+    fig = px.timeline(
+        df,
+        x_start="Start",
+        x_end="Finish",
+        y="Worker",
+        color="Service",
+        text="Customer",
+        hover_data=["Day", "Duration(min)"],
+        custom_data=["TaskId", "Day", "WorkerId"],  # per-trace identifiers so clicks work
+        category_orders={"Worker": [w["name"] for w in WORKERS]},
+    )
+
+    # Layout polish for 2D view
+    fig.update_yaxes(autorange="reversed")  # Gantt convention
+    fig.update_traces(textposition="inside", insidetextanchor="start", textfont_size=12, cliponaxis=False)
+    fig.update_layout(
+        margin=dict(l=20, r=20, t=40, b=20),
+        height=900,
+        xaxis_title=None,
+        yaxis_title=None,
+        legend_title_text="Service",
+    )
+    return fig
+
+def schedule_view(start_day: date, days: int, renderer: str = "auto", focus_day: str = None):
+    """(df, fig) for the window; reruns with an unchanged plan reuse the cached pair."""
+    load_window(start_day, days)  # may bump plan_version, so it goes before the key
+    if days <= DETAIL_MAX_DAYS or focus_day not in window_days(start_day, days):
+        focus_day = None
+    key = (st.session_state.plan_version, start_day.isoformat(), days, renderer, focus_day)
+    cached = st.session_state.view_cache.get(key)
+    if cached is None:
+        with timed("streamlit.schedule_build"):
+            df = build_schedule_df(start_day, days, focus_day)
+        if renderer == "auto":
+            renderer = "webgl" if len(df) > GL_AUTO_BARS else "svg"
+        with timed("streamlit.figure_build"):
+            fig = None if df.empty else build_timeline_figure(df, renderer, aggregated=days > DETAIL_MAX_DAYS)
+        if metrics.ENABLED and fig is not None:
+            metrics.record_bytes("streamlit.figure", "figure", metrics.json_size(fig))
+            metrics.set_gauge("streamlit", "bars", len(df))
+        cached = st.session_state.view_cache.put(key, (df, fig))
+    return cached
+
+def clicked_customdata(fig, pt: dict) -> list:
+    """customdata of a clicked point; streamlit-plotly-events only reports curve/point numbers."""
+    cd = pt.get("customdata")
+    if cd is None and pt.get("curveNumber") is not None and pt.get("pointNumber") is not None:
+        trace = fig.data[pt["curveNumber"]]
+        if trace.customdata is not None and pt["pointNumber"] < len(trace.customdata):
+            cd = trace.customdata[pt["pointNumber"]]
+    return list(cd) if cd is not None else []
 
 def find_task(day_iso: str, task_id: str):
-    ensure_day_exists(day_iso)
-    for col in st.session_state.plan_by_day[day_iso]:
-        for idx, t in enumerate(col["tasks"]):
-            if t["id"] == task_id:
-                return col, idx, t
-    return None, None, None
+    """Return (worker_id, index, task) for a task of the day, or (None, None, None)."""
+    where = st.session_state.task_index.get(task_id)
+    if where is None or where[0] != day_iso:
+        return None, None, None
+    _, worker_id, idx = where
+    return worker_id, idx, tasks_of(day_cols(day_iso), worker_id)[idx]
+
+def delete_task(day_iso: str, task_id: str):
+    worker_id, idx, task = find_task(day_iso, task_id)
+    if not task:
+        return None
+    cols, _ = remove_task(day_cols(day_iso), worker_id, idx)
+    set_day(day_iso, cols)
+    st.session_state.task_index.removed(day_iso, worker_id, tasks_of(cols, worker_id), idx, task_id)
+    return task
 
 def reassign_task(day_iso: str, task_id: str, new_worker_id: str):
-    src_col, idx, task = find_task(day_iso, task_id)
+    worker_id, idx, task = find_task(day_iso, task_id)
     if not task:
         return False
-    src_col["tasks"].pop(idx)
-    for col in st.session_state.plan_by_day[day_iso]:
-        if col["worker_id"] == new_worker_id:
-            col["tasks"].append(task)
-            return True
-    return False
-
-# -------------- STT: audio -> text (Groq/Deepgram) --------------
-def convert_to_wav(audio_bytes: bytes, mime_type: str) -> bytes:
-    try:
-        audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format=(mime_type or "audio/webm").split("/")[-1])
-    except Exception:
-        audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format="webm")
-    buf = io.BytesIO()
-    audio.export(buf, format="wav")
-    return buf.getvalue()
-
-def transcribe_via_api(audio_bytes: bytes, mime_type: str) -> str:
-    provider = st.secrets.get("STT_PROVIDER", "groq").lower()
-    wav_bytes = convert_to_wav(audio_bytes, mime_type)
-
-    if provider == "groq":
-        url = "https://api.groq.com/openai/v1/audio/transcriptions"
-        headers = {"Authorization": f"Bearer {st.secrets['GROQ_API_KEY']}"}
-        files = {
-            "file": ("speech.wav", wav_bytes, "audio/wav"),
-            "model": (None, st.secrets.get("STT_MODEL", "whisper-large-v3-turbo")),
-        }
-        r = requests.post(url, headers=headers, files=files, timeout=60)
-        if not r.ok:
-            raise RuntimeError(f"Groq API error {r.status_code}: {r.text}")
-        return r.json().get("text", "")
-
-    elif provider == "deepgram":
-        url = "https://api.deepgram.com/v1/listen"
-        params = {"model": st.secrets.get("STT_MODEL", "nova-2-general"), "smart_format": "true"}
-        headers = {"Authorization": f"Token {st.secrets['DEEPGRAM_API_KEY']}"}
-        r = requests.post(url, params=params, headers=headers, data=wav_bytes, timeout=60)
-        if not r.ok:
-            raise RuntimeError(f"Deepgram API error {r.status_code}: {r.text}")
-        data = r.json()
-        return (data.get("results", {})
-                    .get("channels", [{}])[0]
-                    .get("alternatives", [{}])[0]
-                    .get("transcript", ""))
-
-    else:
-        raise RuntimeError("Unsupported STT_PROVIDER; set STT_PROVIDER to 'groq' or 'deepgram' in secrets.")
+    index = st.session_state.task_index
+    cols, _ = remove_task(day_cols(day_iso), worker_id, idx)
+    index.removed(day_iso, worker_id, tasks_of(cols, worker_id), idx, task_id)
+    cols = append_task(cols, new_worker_id, task)
+    set_day(day_iso, cols)
+    tasks = tasks_of(cols, new_worker_id)
+    index.inserted(day_iso, new_worker_id, tasks, len(tasks) - 1)
+    return True
+
+# -------------- STT: audio -> text (Groq/Deepgram/stub) --------------
+STT_SETTINGS = ("STT_PROVIDER", "STT_MODEL", "STT_AUDIO_FORMAT", "GROQ_API_KEY", "DEEPGRAM_API_KEY",
+                "STT_STUB_TEXT", "STT_STUB_DELAY_MS", "STT_CACHE")
+
+def stt_settings() -> tuple:
+    """STT settings from the environment, falling back to st.secrets (which may not exist locally)."""
+    secrets = dict(st.secrets) if st.secrets.load_if_toml_exists() else {}
+    return tuple((k, os.environ.get(k) or secrets.get(k)) for k in STT_SETTINGS)
+
+@st.cache_resource(show_spinner=False)
+def stt_client(settings: tuple) -> STTClient:
+    """One pooled client per settings, shared by every session of this process."""
+    return STTClient({k: v for k, v in settings if v is not None})
+
+@st.cache_resource(show_spinner=False)
+def transcript_cache(path: str = None) -> TranscriptCache:
+    """Transcripts by audio hash; STT_CACHE=path adds a SQLite tier that survives restarts."""
+    return TranscriptCache(maxsize=256, path=path)
+
+def transcribe_job(client: STTClient, audio_bytes: bytes, mime_type: str, fmt: str):
+    """(text, prep_stats); runs on the client's pool, so no st.* calls in here."""
+    # 16 kHz mono, silence trimmed
+    with timed("streamlit.stt_prep"):
+        payload, payload_mime, stats = preprocess_audio(audio_bytes, mime_type, fmt=fmt)
+    with timed("streamlit.stt_call"):
+        return client.transcribe(payload, payload_mime), stats
 
 # -------------- Interpreter: text -> command --------------
-SERVICE_CATALOG = [s["name"] for s in SERVICES] + [
-    "swedish", "swedish massage",
-    "thai", "thai massage",
-    "deep tissue",
-    "hot stone",
-    "facial", "facial treatment",
-    "reflexology",
-]
-WORKER_CATALOG = [w["name"] for w in WORKERS]
-SERVICE_ALIASES = {
-    "swedish": "Swedish Massage",
-    "swedish massage": "Swedish Massage",
-    "thai": "Thai Massage",
-    "thai massage": "Thai Massage",
-    "deep tissue": "Deep Tissue",
-    "hot stone": "Hot Stone",
-    "facial": "Facial Treatment",
-    "facial treatment": "Facial Treatment",
-    "reflexology": "Reflexology",
-}
-
-def _best_service_match(text: str):
-    for k, v in SERVICE_ALIASES.items():
-        if re.search(rf"\b{k}\b", text, flags=re.IGNORECASE):
-            return next(s for s in SERVICES if s["name"] == v)
-    name, score = best_extract_one(text, SERVICE_CATALOG, cutoff=80)
-    if not name:
-        return None
-    canon = SERVICE_ALIASES.get(name.lower(), name)
-    return next((s for s in SERVICES if s["name"].lower() == canon.lower()), None)
+PARSER = CommandParser(SERVICES, WORKERS)
 
-def _best_worker_match(text: str):
-    name, score = best_extract_one(text, WORKER_CATALOG, cutoff=80)
-    if not name:
-        return None
-    return next((w for w in WORKERS if w["name"].lower() == name.lower()), None)
-
-def interpret_command(utterance: str):
-    t = utterance.strip()
-    # customer (quoted; or after "customer"; or after "book"/"gives")
-    m = re.search(r'customer\s+"([^"]+)"', t, flags=re.IGNORECASE) \
-        or re.search(r"customer\s+'([^']+)'", t, flags=re.IGNORECASE)
-    if m: customer = m.group(1).strip()
-    else:
-        m2 = re.search(r'customer\s+([A-Za-z][A-Za-z\-]+(?:\s+[A-Za-z][A-Za-z\-]+)?)', t, flags=re.IGNORECASE)
-        customer = m2.group(1).strip() if m2 else None
-        if not customer:
-            m3 = re.search(r'\bbook\s+([A-Za-z][A-Za-z\-]+(?:\s+[A-Za-z][A-Za-z\-]+)?)\b', t, flags=re.IGNORECASE) \
-                 or re.search(r'\bgives\s+([A-Za-z][A-Za-z\-]+(?:\s+[A-Za-z][A-Za-z\-]+)?)\b', t, flags=re.IGNORECASE)
-            customer = m3.group(1).strip() if m3 else None
-
-    # worker (with/to <name> … else fuzzy on whole)
-    m_w = re.search(r'\bwith\s+([A-Za-z]+)\b', t, flags=re.IGNORECASE) \
-          or re.search(r'\bto\s+([A-Za-z]+)\b', t, flags=re.IGNORECASE)
-    worker = _best_worker_match(m_w.group(1)) if m_w else _best_worker_match(t)
-
-    # service (aliases/fuzzy)
-    service = _best_service_match(t)
-
-    if service and worker and customer:
-        return {"action": "add", "service_id": service["id"], "worker_id": worker["id"], "customer": customer}
-    return None
+def interpret_commands(utterance: str):
+    """(commands, unparsed clauses); one transcript may book a whole group."""
+    return PARSER.parse_all(utterance, st.session_state.customer_index)
 
-def apply_command(day_iso: str, cmd: dict):
-    if not cmd or cmd.get("action") != "add":
+def apply_commands(day_iso: str, cmds: list):
+    """Validate the add commands together, then write them all with one push_batch (all or nothing)."""
+    if not cmds or any(not c or c.get("action") != "add" for c in cmds):
         return False, "Unsupported or empty command."
-    push_to_plan(day_iso, cmd["customer"], cmd["service_id"], cmd["worker_id"])
-    svc_name = next(s["name"] for s in SERVICES if s["id"] == cmd["service_id"])
-    w_name   = next(w["name"] for w in WORKERS  if w["id"] == cmd["worker_id"])
-    return True, f"Added {svc_name} for {cmd['customer']} → {w_name} on {day_iso}"
+    bookings = [(c["customer"], c["service_id"], c["worker_id"]) for c in cmds]
+    gaps = [random.choice(GAP_CHOICES) for _ in cmds]
+    problem = check_batch(day_iso, bookings, gaps)
+    if problem:
+        return False, problem
+    placed = push_batch(day_iso, bookings, gaps)
+    return True, "  \n".join(
+        f"Added {services_idx[c['service_id']]['name']} for {c['customer']} → {workers_idx[wid]['name']} on {day_iso}"
+        for c, wid in zip(cmds, placed)
+    )
 
 # -------------------- Layout ------------------------
 left, right = st.columns([1, 4], gap="large")
@@ -292,59 +573,139 @@ with left:
     with c_date:
         sel_day = st.date_input("Start day", value=today, min_value=today, format="YYYY-MM-DD", key="start_day")
     with c_span:
-        span_days = st.selectbox("Days", options=[3, 4], index=0, help="How many days to show on the timeline?")
+        span_days = st.selectbox("Days", options=list(SPANS), index=0, format_func=SPANS.get, key="span_days",
+                                 help="How many days to show on the timeline? Week and month views show daily blocks; click one to expand that day.")
     with c_menu:
         # neat 3-dots popover for admin tools (like reset)
         with st.popover("⋮"):
             st.write("Admin tools")
+            st.radio("Gantt renderer", ["auto", "svg", "webgl"], horizontal=True, key="renderer",
+                     help=f"auto uses WebGL above {GL_AUTO_BARS} bars")
+            if st.button("↶ Undo", disabled=not st.session_state.history.can_undo, use_container_width=True):
+                replace_plan(st.session_state.history.undo(st.session_state.plan_by_day))
+                st.session_state.selected_task = None
+                st.rerun()
+            if st.button("↷ Redo", disabled=not st.session_state.history.can_redo, use_container_width=True):
+                replace_plan(st.session_state.history.redo(st.session_state.plan_by_day))
+                st.session_state.selected_task = None
+                st.rerun()
+            if st.button("⚖ Re-balance start day", use_container_width=True,
+                         help="Redistribute the start day's bookings across therapists to finish earliest."):
+                left_over = rebalance_day(sel_day.isoformat())
+                if left_over:
+                    st.warning(f"{left_over} booking(s) would not fit before closing; day left unchanged.")
+                else:
+                    st.session_state.selected_task = None
+                    st.rerun()
             if st.button("Reset seeded 3 days"):
                 st.session_state.seq = 0
-                st.session_state.plan_by_day = {}
-                for i in range(3):
-                    d = today + timedelta(days=i)
-                    st.session_state.plan_by_day[d.isoformat()] = [{"worker_id": w["id"], "tasks": []} for w in WORKERS]
+                st.session_state.history.clear()
+                if plan_db:
+                    plan_db.clear()  # days not in the new plan would otherwise load back from the file
+                replace_plan({
+                    (today + timedelta(days=i)).isoformat(): [column(w["id"], []) for w in WORKERS]
+                    for i in range(3)
+                })
                 st.session_state.mic_audio_bytes = None
                 st.session_state.mic_audio_mime  = None
                 st.session_state.mic_transcript  = None
-                st.session_state.mic_cmd         = None
+                st.session_state.mic_cmds        = None
                 st.session_state.selected_task   = None
-                st.experimental_rerun()
+                st.rerun()
 
     # Voice flow: record -> transcribe -> preview -> push
     if audio_file is not None:
         st.session_state.mic_audio_bytes = audio_file.getvalue()
         st.session_state.mic_audio_mime  = audio_file.type or "audio/webm"
         st.audio(st.session_state.mic_audio_bytes, format=st.session_state.mic_audio_mime)
-        if st.button("Transcribe", key="transcribe_btn", use_container_width=True):
+        if st.button("Transcribe", key="transcribe_btn", use_container_width=True,
+                     disabled=st.session_state.mic_job is not None):
             try:
-                txt = transcribe_via_api(st.session_state.mic_audio_bytes, st.session_state.mic_audio_mime)
-                st.session_state.mic_transcript = txt
-                st.session_state.mic_cmd = interpret_command(txt) if txt else None
+                settings = stt_settings()
+                client = stt_client(settings)
+                fmt = dict(settings).get("STT_AUDIO_FORMAT") or "flac"
+                cache = transcript_cache(dict(settings).get("STT_CACHE"))
+                key = transcript_key(st.session_state.mic_audio_bytes, client.provider, client.model, fmt)
+                hit = cache.get(key)
+                if hit is not None:
+                    # same clip, provider and model as before: no upload; parsed against this session's customers
+                    st.session_state.mic_transcript = hit
+                    parsed = interpret_commands(hit) if hit else ([], [])
+                    st.session_state.mic_cmds, st.session_state.mic_unparsed = parsed
+                    st.session_state.mic_prep_stats = {"cached": True}
+                else:
+                    st.session_state.mic_cache_key = key
+                    st.session_state.mic_job = client.submit(
+                        transcribe_job, client, st.session_state.mic_audio_bytes, st.session_state.mic_audio_mime, fmt,
+                    )
             except Exception as e:
                 st.error(f"Transcription error: {e}")
 
+    @st.fragment(run_every=0.5 if st.session_state.mic_job is not None else None)
+    def transcription_status():
+        """Polls the background job; only this fragment reruns while the upload is in flight."""
+        job = st.session_state.mic_job
+        if job is None:
+            return
+        if not job.done():
+            st.info("Transcribing…")
+            return
+        st.session_state.mic_job = None
+        try:
+            txt, st.session_state.mic_prep_stats = job.result()
+            st.session_state.mic_transcript = txt
+            parsed = interpret_commands(txt) if txt else ([], [])
+            st.session_state.mic_cmds, st.session_state.mic_unparsed = parsed
+            if st.session_state.mic_cache_key:
+                transcript_cache(dict(stt_settings()).get("STT_CACHE")).put(st.session_state.mic_cache_key, txt)
+        except Exception as e:
+            st.session_state.mic_error = f"Transcription error: {e}"
+        st.rerun()
+
+    transcription_status()
+    if st.session_state.mic_error:
+        st.error(st.session_state.mic_error)
+        st.session_state.mic_error = None
+
     if st.session_state.mic_transcript is not None:
         st.markdown("**Transcript:**")
         st.code(st.session_state.mic_transcript)
-        if st.session_state.mic_cmd:
-            cmd = st.session_state.mic_cmd
-            svc_name = next(s["name"] for s in SERVICES if s["id"] == cmd["service_id"])
-            w_name   = next(w["name"] for w in WORKERS  if w["id"] == cmd["worker_id"])
-            st.success(f"Parsed → Service: {svc_name} | Worker: {w_name} | Customer: {cmd['customer']}")
-            if st.button("Push to plan (voice)", type="primary", use_container_width=True):
-                ok, msg = apply_command(sel_day.isoformat(), cmd)
+        prep = st.session_state.mic_prep_stats
+        if prep and prep.get("cached"):
+            cs = transcript_cache(dict(stt_settings()).get("STT_CACHE")).stats()
+            st.caption(f"From cache • {cs['hits'] + cs['disk_hits']} hits / {cs['misses']} misses")
+        elif prep:
+            lat = stt_client(stt_settings()).stats()
+            st.caption(f"Upload {prep['bytes_out'] / 1024:.0f} KB ({prep['format']}) "
+                       f"from {prep['bytes_in'] / 1024:.0f} KB • prep {prep['ms']:.0f} ms • "
+                       f"{lat['provider']} p50 {lat['p50_ms']} ms over {lat['calls']} calls")
+        if st.session_state.mic_cmds:
+            cmds = st.session_state.mic_cmds
+            st.success("  \n".join(
+                f"Parsed → Service: {services_idx[c['service_id']]['name']} | Worker: {worker_label(c['worker_id'])}"
+                f" | Customer: {c['customer']}"
+                for c in cmds
+            ))
+            if st.session_state.mic_unparsed:
+                st.warning("Skipped: " + " • ".join(st.session_state.mic_unparsed))
+            label = "Push to plan (voice)" if len(cmds) == 1 else f"Push {len(cmds)} bookings to plan (voice)"
+            if st.button(label, type="primary", use_container_width=True):
+                ok, msg = apply_commands(sel_day.isoformat(), cmds)
                 if ok:
                     st.success(msg)
                     st.session_state.mic_transcript = None
-                    st.session_state.mic_cmd = None
+                    st.session_state.mic_cmds = None
+                    st.session_state.mic_unparsed = None
+                else:
+                    st.warning(msg)
         else:
             st.warning("Couldn’t parse a full booking. Try the example above.")
             if st.button("Record again", key="retry_btn", use_container_width=True):
                 st.session_state.mic_audio_bytes = None
                 st.session_state.mic_audio_mime  = None
                 st.session_state.mic_transcript  = None
-                st.session_state.mic_cmd         = None
-                st.experimental_rerun()
+                st.session_state.mic_cmds        = None
+                st.rerun()
 
     st.divider()
 
@@ -359,14 +720,21 @@ with left:
     )
     m_worker = st.selectbox(
         "Worker",
-        options=[w["id"] for w in WORKERS],
-        format_func=lambda wid: workers_idx[wid]["name"],
+        options=[w["id"] for w in WORKERS] + [AUTO],
+        format_func=worker_label,
         key="manual_worker",
     )
+    m_start, m_problem = check_slot(sel_day.isoformat(), m_service, m_worker)
+    if m_problem:
+        st.caption(f"⚠️ {m_problem}")
+    else:
+        st.caption(f"Starts at {m_start} on {sel_day.isoformat()}.")
     if st.button("Push to plan", type="primary", use_container_width=True):
-        if m_customer and m_service and m_worker:
-            push_to_plan(sel_day.isoformat(), m_customer, m_service, m_worker)
-            st.success(f"Added {services_idx[m_service]['name']} for {m_customer} → {workers_idx[m_worker]['name']} on {sel_day.isoformat()}")
+        if m_problem:
+            st.warning(m_problem)
+        elif m_customer and m_service and m_worker:
+            placed_on = push_to_plan(sel_day.isoformat(), m_customer, m_service, m_worker)
+            st.success(f"Added {services_idx[m_service]['name']} for {m_customer} → {workers_idx[placed_on]['name']} on {sel_day.isoformat()}")
         else:
             st.warning("Please complete all fields.")
 
@@ -404,74 +772,87 @@ with left:
             ec1, ec2, ec3 = st.columns([2,2,1])
             with ec1:
                 if st.button("Save changes", type="primary", use_container_width=True):
-                    if e_worker != cur_worker_id:
+                    moved = e_worker != cur_worker_id
+                    if moved:
                         reassign_task(day_iso, task_id, e_worker)
                         cur_worker_id = e_worker
-                    col, idx, task_ref = find_task(day_iso, task_id)
+                    worker_id, idx, task_ref = find_task(day_iso, task_id)
                     if task_ref:
-                        task_ref["customer"]   = e_customer
-                        task_ref["service_id"] = e_service
+                        # one undo step covers the move and the field edits together
+                        set_day(day_iso, update_task(day_cols(day_iso), worker_id, idx,
+                                                     customer=e_customer, service_id=e_service),
+                                undoable=not moved)
+                        remember_customers([{"customer": e_customer}])  # a renamed customer snaps from now on
                         st.success("Booking updated.")
                         st.session_state.selected_task = None
-                        st.experimental_rerun()
+                        st.rerun()
             with ec2:
                 if st.button("Delete booking", use_container_width=True):
-                    col, idx, task_ref = find_task(day_iso, task_id)
-                    if task_ref:
-                        col["tasks"].pop(idx)
+                    if delete_task(day_iso, task_id):
                         st.success("Booking deleted.")
                         st.session_state.selected_task = None
-                        st.experimental_rerun()
+                        st.rerun()
             with ec3:
                 if st.button("Cancel", use_container_width=True):
                     st.session_state.selected_task = None
-                    st.experimental_rerun()
+                    st.rerun()
     else:
         st.info("Click a bar in the chart to edit.")
 
 with right:
     st.subheader(f"Schedule • {sel_day.isoformat()} → {(sel_day + timedelta(days=span_days-1)).isoformat()}")
 
-    df = build_schedule_df(sel_day, days=span_days)
+    df, fig = schedule_view(sel_day, span_days, st.session_state.get("renderer", "auto"), st.session_state.focus_day)
+    if span_days > DETAIL_MAX_DAYS:
+        focus = st.session_state.focus_day
+        if focus and focus in window_days(sel_day, span_days):
+            if st.button(f"Collapse {focus}", help="Show this day as blocks again."):
+                st.session_state.focus_day = None
+                st.rerun()
+        else:
+            st.caption("Showing one block per therapist per day. Click a block to expand that day.")
     if df.empty:
         st.info("No bookings yet. Use the mic or the form on the left.")
     else:
-        # Colors by Service; one row per worker; full time axis over multiple days
-        fig = px.timeline(
-            df,
-            x_start="Start",
-            x_end="Finish",
-            y="Worker",
-            color="Service",
-            text="Customer",
-            hover_data=["Day", "Duration(min)"],
-            category_orders={"Worker": [w["name"] for w in WORKERS]},
-        )
-        # Attach identifiers so clicks work
-        fig.update_traces(customdata=df[["TaskId", "Day", "WorkerId"]].to_numpy().tolist())
-
-        # Layout polish for 2D view
-        fig.update_yaxes(autorange="reversed")  # Gantt convention
-        fig.update_traces(textposition="inside", insidetextanchor="start", textfont_size=12, cliponaxis=False)
-        fig.update_layout(
-            margin=dict(l=20, r=20, t=40, b=20),
-            height=900,
-            xaxis_title=None,
-            yaxis_title=None,
-            legend_title_text="Service",
-        )
-
         # Interactions: click a bar to edit
-        events = plotly_events(
-            fig, click_event=True, hover_event=False, select_event=False,
-            override_height=900, key="gantt_click_events"
-        )
+        with timed("streamlit.plotly_events"):
+            events = plotly_events(
+                fig, click_event=True, hover_event=False, select_event=False,
+                override_height=900, key="gantt_click_events"
+            )
         if events:
             pt = events[0]
-            cd = pt.get("customdata") or []
-            if isinstance(cd, list) and len(cd) >= 3:
+            cd = clicked_customdata(fig, pt)
+            if len(cd) >= 3 and not cd[0]:
+                if st.session_state.focus_day != cd[1]:  # aggregated block: expand its day
+                    st.session_state.focus_day = cd[1]
+                    st.rerun()
+            elif len(cd) >= 3:
                 task_id, day_iso, worker_id = cd[0], cd[1], cd[2]
                 st.session_state.selected_task = {"task_id": task_id, "day": day_iso, "worker_id": worker_id}
                 st.rerun()
 
-st.caption("Tip: Use mic or form to add on the selected start day. Chart shows 3–4 days on one timeline with one row per worker.")
+if plan_db:
+    plan_db.flush()  # one write transaction per rerun
+
+# only the days on screen (and the one being edited) stay as dicts between reruns
+park_days(set(window_days(sel_day, span_days)) | {(st.session_state.selected_task or {}).get("day")})
+
+if metrics.ENABLED:
+    plan = st.session_state.plan_by_day
+    parked = [cols for cols in plan.values() if isinstance(cols, PackedDay)]
+    metrics.set_gauge("streamlit", "tasks", sum(cols.n_tasks() if isinstance(cols, PackedDay) else
+                                                 sum(len(c["tasks"]) for c in cols) for cols in plan.values()))
+    metrics.set_gauge("streamlit", "parked_days", len(parked))
+    # parked days are measured packed (never unpacked here); only the live ones are serialized
+    metrics.record_bytes("streamlit.plan", "state", metrics.json_size(
+        {d: cols for d, cols in plan.items() if not isinstance(cols, PackedDay)}))
+    metrics.record_bytes("streamlit.plan", "parked", sum(cols.nbytes() for cols in parked))
+    metrics.observe("streamlit.rerun", time.perf_counter() - rerun_t0)
+    with st.expander("⏱ Metrics (debug)"):
+        timings, sizes, gauges = metrics.snapshot()
+        st.caption("Process-wide, all sessions. Times in ms over the last 256 samples per phase.")
+        st.dataframe(pd.DataFrame(timings), hide_index=True, use_container_width=True)
+        st.json({"last payload bytes": sizes, "gauges": gauges}, expanded=False)
+
+st.caption("Tip: Use mic or form to add on the selected start day. Chart shows up to a month on one timeline with one row per worker.")
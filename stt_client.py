@@ -0,0 +1,125 @@
+# Speech-to-text client shared by every session of the Streamlit planner.
+# One pooled keep-alive requests.Session per process, bounded retries with exponential backoff on
+# connection errors / 429 / 5xx, per-provider latency tracking, and a small thread pool so the UI can
+# poll a Future instead of blocking the script thread. STT_PROVIDER=stub answers locally for load tests.
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+PROVIDERS = ("groq", "deepgram", "stub")
+RETRY_STATUS = {429, 500, 502, 503, 504}
+DEFAULT_MODELS = {"groq": "whisper-large-v3-turbo", "deepgram": "nova-2-general"}
+STUB_TEXT = "add a swedish massage to Budi for customer Ali"
+
+class TransientSTTError(RuntimeError):
+    """A failure worth retrying (throttling, 5xx, dropped connection)."""
+
+class STTClient:
+    """config holds STT_PROVIDER, STT_MODEL, GROQ_API_KEY / DEEPGRAM_API_KEY and, for the stub,
+    STT_STUB_TEXT and STT_STUB_DELAY_MS; it is read once, off any UI thread."""
+
+    def __init__(self, config: dict, retries: int = 2, backoff_s: float = 0.5,
+                 timeout=(5, 60), workers: int = 4, latency_window: int = 200):
+        self.provider = str(config.get("STT_PROVIDER") or "groq").lower()
+        if self.provider not in PROVIDERS:
+            raise RuntimeError(f"Unsupported STT_PROVIDER {self.provider!r}; use one of {', '.join(PROVIDERS)}.")
+        self.config = dict(config)
+        self.model = self.config.get("STT_MODEL") or DEFAULT_MODELS.get(self.provider)
+        self.retries, self.backoff_s, self.timeout = retries, backoff_s, timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stt")
+        self._lock = threading.Lock()
+        self._latency = deque(maxlen=latency_window)  # ms of successful calls
+        self._counts = {"calls": 0, "errors": 0, "retries": 0}
+
+    # ---- calls ----
+    def transcribe(self, payload: bytes, mime_type: str) -> str:
+        """Blocking transcription with bounded retries; raises RuntimeError on final failure."""
+        t0 = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                text = self._call(payload, mime_type)
+                self._record(time.perf_counter() - t0, ok=True)
+                return text
+            except (TransientSTTError, requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries:
+                    self._record(time.perf_counter() - t0, ok=False)
+                    raise RuntimeError(f"{self.provider} STT failed after {attempt + 1} attempts: {e}") from e
+                with self._lock:
+                    self._counts["retries"] += 1
+                time.sleep(getattr(e, "retry_after", None) or self.backoff_s * 2 ** attempt * (1 + random.random() / 2))
+            except Exception:
+                self._record(time.perf_counter() - t0, ok=False)
+                raise
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn (usually preprocess + transcribe) on the client's pool; returns a Future."""
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def _call(self, payload: bytes, mime_type: str) -> str:
+        if self.provider == "stub":
+            time.sleep(float(self.config.get("STT_STUB_DELAY_MS", 300)) / 1000)
+            return str(self.config.get("STT_STUB_TEXT") or STUB_TEXT)
+        if self.provider == "groq":
+            r = self.session.post(
+                "https://api.groq.com/openai/v1/audio/transcriptions",
+                headers={"Authorization": f"Bearer {self.config['GROQ_API_KEY']}"},
+                files={
+                    "file": ("speech." + mime_type.split("/")[-1], payload, mime_type),
+                    "model": (None, self.model),
+                },
+                timeout=self.timeout,
+            )
+            self._check(r, "Groq")
+            return r.json().get("text", "")
+        r = self.session.post(
+            "https://api.deepgram.com/v1/listen",
+            params={"model": self.model, "smart_format": "true"},
+            headers={"Authorization": f"Token {self.config['DEEPGRAM_API_KEY']}", "Content-Type": mime_type},
+            data=payload,
+            timeout=self.timeout,
+        )
+        self._check(r, "Deepgram")
+        data = r.json()
+        return (data.get("results", {})
+                    .get("channels", [{}])[0]
+                    .get("alternatives", [{}])[0]
+                    .get("transcript", ""))
+
+    @staticmethod
+    def _check(r, name: str):
+        if r.ok:
+            return
+        if r.status_code in RETRY_STATUS:
+            err = TransientSTTError(f"{name} API error {r.status_code}: {r.text[:200]}")
+            ra = r.headers.get("Retry-After", "")
+            err.retry_after = min(float(ra), 10.0) if ra.replace(".", "", 1).isdigit() else None
+            raise err
+        raise RuntimeError(f"{name} API error {r.status_code}: {r.text}")
+
+    # ---- latency ----
+    def _record(self, seconds: float, ok: bool):
+        with self._lock:
+            self._counts["calls"] += 1
+            if ok:
+                self._latency.append(seconds * 1000)
+            else:
+                self._counts["errors"] += 1
+
+    def stats(self) -> dict:
+        """Counters plus p50/p95 latency (ms, successful calls, including retries) for this provider."""
+        with self._lock:
+            lat = sorted(self._latency)
+            out = {"provider": self.provider, **self._counts}
+        pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))], 1) if lat else None
+        out.update(p50_ms=pick(0.5), p95_ms=pick(0.95))
+        return out
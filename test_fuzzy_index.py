@@ -0,0 +1,37 @@
+# Customer snapping must not file a new client under an existing one whose name starts the same way.
+# Run with: python -m pytest -q
+
+import pytest
+
+import fuzzy_index
+from command_parser import CommandParser
+from fuzzy_index import FuzzyIndex
+from spa_data import SERVICES, WORKERS
+
+KNOWN = ["Alina", "Tommy", "Anastasia", "Maya Sari", "John Smith"]
+PREFIXES = [("Ali", "Alina"), ("Tom", "Tommy"), ("Ana", "Anastasia"), ("Maya", "Maya Sari"), ("John", "John Smith")]
+
+@pytest.fixture(params=["rapidfuzz", "difflib"])
+def scorer(request, monkeypatch):
+    if request.param == "difflib":
+        monkeypatch.setattr(fuzzy_index, "process", None)
+    elif fuzzy_index.process is None:
+        pytest.skip("rapidfuzz not installed")
+    return request.param
+
+@pytest.fixture
+def customers():
+    return FuzzyIndex({name: name for name in KNOWN})
+
+@pytest.mark.parametrize("new, existing", PREFIXES)
+def test_prefix_is_not_a_match(scorer, customers, new, existing):
+    assert customers.match(new, cutoff=88, whole=True) == (None, None, 0)
+
+@pytest.mark.parametrize("heard, existing", [("Alinaa", "Alina"), ("Jon Smith", "John Smith"), ("Sari Maya", "Maya Sari")])
+def test_misheard_name_still_snaps(scorer, customers, heard, existing):
+    assert customers.match(heard, cutoff=88, whole=True)[1] == existing
+
+@pytest.mark.parametrize("new, existing", PREFIXES)
+def test_parse_keeps_new_customer(scorer, customers, new, existing):
+    cmd = CommandParser(SERVICES, WORKERS).parse(f"customer '{new}' wants thai massage", customers)
+    assert cmd is not None and cmd["customer"] == new
@@ -0,0 +1,64 @@
+# Content-addressed cache of voice transcripts, shared by every session of the Streamlit planner.
+# Key = sha256 of the raw recording + STT provider + model + upload format, so re-pressing
+# "Transcribe" on the same clip never pays for a second STT call. The memory tier is an LRU of
+# transcripts; the optional SQLite tier (STT_CACHE=path) keeps them across restarts. Only text is
+# cached: parsing snaps names to the session's own customers, so each session parses for itself.
+
+import hashlib
+import sqlite3
+import threading
+from contextlib import closing
+
+from utils import LRUCache
+
+def transcript_key(audio_bytes: bytes, provider: str, model: str, fmt: str) -> str:
+    h = hashlib.sha256(audio_bytes)
+    h.update(f"|{provider}|{model}|{fmt}".encode())
+    return h.hexdigest()
+
+class TranscriptCache:
+    SCHEMA = "CREATE TABLE IF NOT EXISTS transcripts (key TEXT PRIMARY KEY, text TEXT NOT NULL)"
+
+    def __init__(self, maxsize: int = 256, path: str = None):
+        self.path = path
+        self._mem = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self.counts = {"hits": 0, "disk_hits": 0, "misses": 0}
+        if path:
+            with closing(self._connect()) as db:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute(self.SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def get(self, key: str):
+        """The transcript or None; a disk hit is promoted to memory."""
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self.counts["hits"] += 1
+                return entry
+        row = None
+        if self.path:
+            with closing(self._connect()) as db:
+                row = db.execute("SELECT text FROM transcripts WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.counts["misses"] += 1
+                return None
+            self.counts["disk_hits"] += 1
+            return self._mem.put(key, row[0])
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._mem.put(key, text)
+        if self.path:
+            with closing(self._connect()) as db:
+                db.execute("INSERT OR REPLACE INTO transcripts (key, text) VALUES (?, ?)", (key, text))
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            hit = self.counts["hits"] + self.counts["disk_hits"]
+            return {**self.counts, "entries": len(self._mem), "hit_rate": round(hit / total, 3) if total else None}
@@ -1,6 +1,14 @@
+from bisect import bisect_right
+from collections import OrderedDict
 from datetime import datetime, timedelta, date
+from itertools import accumulate
+import threading
+import numpy as np
 import pandas as pd
 
+SCHEDULE_COLUMNS = ["TaskId", "Worker", "Customer", "Service", "Start", "Finish", "Duration(min)"]
+EPOCH = datetime(1970, 1, 1)
+
 def round_up_minutes(dt: datetime, minutes: int) -> datetime:
     q, r = divmod(dt.minute, minutes)
     if r == 0 and dt.second == 0 and dt.microsecond == 0:
@@ -9,27 +17,224 @@ def round_up_minutes(dt: datetime, minutes: int) -> datetime:
     hour_add, minute = divmod(new_min, 60)
     return dt.replace(hour=(dt.hour + hour_add), minute=minute, second=0, microsecond=0)
 
-def build_schedule_df(state, services_index, workers_index, day_start, slot_min=15):
-    """Return a DataFrame for px.timeline, including TaskId so the JS can identify bars."""
-    today = date.today()
-    day_start_dt = datetime.combine(today, day_start)
-    rows = []
-    for w in state.get("workers", []):
-        cur = round_up_minutes(day_start_dt, slot_min)
-        for item in w.get("tasks", []):
-            svc = services_index[item["service_id"]]
-            start = cur
-            end = start + timedelta(minutes=svc["duration_min"])
-            rows.append({
-                "TaskId": item["id"],
-                "Worker": workers_index[w["worker_id"]]["name"],
-                "Customer": item["customer"],
-                "Service": svc["name"],
-                "Start": start,
-                "Finish": end,
-                "Duration(min)": svc["duration_min"],
-            })
-            cur = end
-    if not rows:
-        return pd.DataFrame(columns=["TaskId","Worker","Customer","Service","Start","Finish","Duration(min)"])
-    return pd.DataFrame(rows)
+def day_base(day_start, slot_min=15, day=None) -> datetime:
+    """First bookable slot of `day` (default today): day_start rounded up to the slot grid."""
+    return round_up_minutes(datetime.combine(day or date.today(), day_start), slot_min)
+
+def epoch_minutes(dt: datetime) -> int:
+    """Naive datetime -> whole minutes since 1970-01-01 (the engine's int64 time base)."""
+    return (dt - EPOCH) // timedelta(minutes=1)
+
+def minutes_to_datetime64(minutes: np.ndarray) -> np.ndarray:
+    return minutes.astype(np.int64).view("datetime64[m]").astype("datetime64[ns]")
+
+def service_codes(services_index):
+    """Return (code_by_id, durations, names); codes follow the index's insertion order."""
+    ids = list(services_index)
+    code_by_id = {sid: i for i, sid in enumerate(ids)}
+    durations = np.array([services_index[sid]["duration_min"] for sid in ids], dtype=np.int64)
+    names = np.array([services_index[sid]["name"] for sid in ids], dtype=object)
+    return code_by_id, durations, names
+
+def schedule_columns(rows, services_index, gap_field=None):
+    """Lay out partitioned task lists as typed columns.
+
+    rows: sequence of (base_min, tasks), one per (day, worker) row; base_min is the first start
+    of that row in epoch minutes. gap_field names a task key holding idle minutes after that task.
+    Starts come from one grouped cumulative sum over int64 minute offsets.
+    """
+    code_by_id, durations, _ = service_codes(services_index)
+    lengths = np.fromiter((len(tasks) for _, tasks in rows), dtype=np.int64, count=len(rows))
+    bases = np.fromiter((base for base, _ in rows), dtype=np.int64, count=len(rows))
+    n = int(lengths.sum())
+
+    tasks = [t for _, row_tasks in rows for t in row_tasks]
+    svc = np.fromiter((code_by_id[t["service_id"]] for t in tasks), dtype=np.int64, count=n)
+    dur = durations[svc]
+    if gap_field:
+        step = dur + np.fromiter((t.get(gap_field, 0) for t in tasks), dtype=np.int64, count=n)
+    else:
+        step = dur
+
+    # exclusive running total, then rebase each row on its own first task
+    running = np.concatenate(([0], np.cumsum(step)))
+    row = np.repeat(np.arange(len(rows)), lengths)
+    row_first = np.cumsum(lengths) - lengths
+    start = bases[row] + running[:-1] - running[row_first][row]
+    return {
+        "row": row,
+        "svc": svc,
+        "TaskId": np.array([t["id"] for t in tasks], dtype=object),
+        "Customer": np.array([t["customer"] for t in tasks], dtype=object),
+        "start": start,
+        "finish": start + dur,
+        "dur": dur,
+    }
+
+def _frame_data(cols, services_index) -> dict:
+    _, _, svc_names = service_codes(services_index)
+    return {
+        "TaskId": cols["TaskId"],
+        "Customer": cols["Customer"],
+        "Service": svc_names[cols["svc"]],
+        "Start": minutes_to_datetime64(cols["start"]),
+        "Finish": minutes_to_datetime64(cols["finish"]),
+        "Duration(min)": cols["dur"],
+    }
+
+def schedule_frame(rows, services_index, row_fields, columns, gap_field=None):
+    """Build the timeline DataFrame in one step from schedule_columns().
+
+    row_fields maps a column name to one value per row (e.g. the worker name); columns gives the order.
+    """
+    cols = schedule_columns(rows, services_index, gap_field)
+    if not len(cols["row"]):
+        return pd.DataFrame(columns=columns)
+    data = _frame_data(cols, services_index)
+    for name, values in row_fields.items():
+        data[name] = np.asarray(values, dtype=object)[cols["row"]]
+    return pd.DataFrame({c: data[c] for c in columns})
+
+def row_part(base_min, tasks, services_index, row_fields, columns, gap_field=None) -> dict:
+    """One row laid out as column arrays (a piece for concat_parts); row_fields holds the row's scalars."""
+    cols = schedule_columns([(base_min, tasks)], services_index, gap_field)
+    data = _frame_data(cols, services_index)
+    for name, value in row_fields.items():
+        data[name] = np.full(len(cols["row"]), value, dtype=object)
+    return {c: data[c] for c in columns}
+
+def concat_parts(parts, columns) -> pd.DataFrame:
+    """The timeline DataFrame from row pieces, one array concatenation per column."""
+    parts = [p for p in parts if len(p["TaskId"])]
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame({c: np.concatenate([p[c] for p in parts]) for c in columns})
+
+def build_schedule_df(state, services_index, workers_index, day_start, slot_min=15, parts=None):
+    """Return a DataFrame for px.timeline, including TaskId so the JS can identify bars.
+
+    parts (a RowParts) reuses the rows of workers whose column did not change since the last call.
+    """
+    base = epoch_minutes(day_base(day_start, slot_min))
+    workers = state.get("workers", [])
+    if parts is not None:
+        def build(col):
+            return row_part(base, col.get("tasks", []), services_index,
+                            {"Worker": workers_index[col["worker_id"]]["name"]}, SCHEDULE_COLUMNS)
+        return concat_parts([parts.get(base, w, build) for w in workers], SCHEDULE_COLUMNS)
+    return schedule_frame(
+        [(base, w.get("tasks", [])) for w in workers],
+        services_index,
+        {"Worker": [workers_index[w["worker_id"]]["name"] for w in workers]},
+        SCHEDULE_COLUMNS,
+    )
+
+class RowParts:
+    """Materialized (day, worker) rows, rebuilt only when their column changes.
+
+    A column is known by its "rev" stamp (see plan_state), so Dash states decoded afresh on every
+    callback still hit; an unstamped column is known by identity. context separates rows that lay out
+    differently (day, first slot). Thread-safe; builds counts the rows actually laid out.
+    """
+
+    def __init__(self, maxsize=4096):
+        self._parts = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, context, col, build):
+        rev = col.get("rev")
+        key = (context, rev if rev is not None else id(col))
+        with self._lock:
+            hit = self._parts.get(key)
+        if hit is not None and (rev is not None or hit[0] is col):
+            return hit[1]
+        part = build(col)
+        with self._lock:
+            # an unstamped col is kept alive so its id() is not reused meanwhile; a stamped one is not held
+            self._parts.put(key, (col if rev is None else None, part))
+            self.builds += 1
+        return part
+
+    def clear(self):
+        with self._lock:
+            self._parts.clear()
+
+class StartIndex:
+    """Per-column prefix sums of task start offsets (minutes after the row's first slot), kept by rev.
+
+    bounds[i] is the start of task i and bounds[-1] the row's end. A column is known by its "rev" stamp
+    (see plan_state), like RowParts: its bounds are summed on first use and an edit derives the rewritten
+    column's bounds from the old ones with insert()/remove() instead of summing again. Cached lists are
+    never changed in place. Shared by all sessions and thread-safe; an unstamped column is summed each time.
+    """
+
+    def __init__(self, services_index, maxsize=4096):
+        self._services = services_index
+        self._bounds = LRUCache(maxsize)  # rev -> [0, end_1, ..., end_k]
+        self._lock = threading.Lock()
+
+    def _row(self, col):
+        rev = col.get("rev")
+        if rev is not None:
+            with self._lock:
+                bounds = self._bounds.get(rev)
+            if bounds is not None:
+                return bounds
+        durs = (self._services[t["service_id"]]["duration_min"] for t in col["tasks"])
+        bounds = list(accumulate(durs, initial=0))
+        self._put(col, bounds)
+        return bounds
+
+    def _put(self, col, bounds):
+        if col.get("rev") is not None:
+            with self._lock:
+                self._bounds.put(col["rev"], bounds)
+
+    def position(self, col, offset_min):
+        """Insertion index for a bar dropped at offset_min: the number of tasks starting at or before it."""
+        bounds = self._row(col)
+        return bisect_right(bounds, offset_min, 0, len(bounds) - 1)
+
+    def insert(self, col, pos, duration_min, new_col):
+        """new_col is col with a task of duration_min inserted at pos."""
+        bounds = self._row(col)
+        self._put(new_col, bounds[:pos + 1] + [b + duration_min for b in bounds[pos:]])
+
+    def remove(self, col, pos, new_col):
+        """new_col is col without its task at pos."""
+        bounds = self._row(col)
+        duration_min = bounds[pos + 1] - bounds[pos]
+        self._put(new_col, bounds[:pos + 1] + [b - duration_min for b in bounds[pos + 2:]])
+
+class LRUCache:
+    """Small least-recently-used mapping: get() refreshes an entry, put() evicts the oldest past maxsize."""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return value
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()